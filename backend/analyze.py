@@ -6,15 +6,22 @@ Extracts contradictions and detects obsolete documents
 import json
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+from llm_executor import create_model, generate, run_concurrently
+from llm_cache import cache_get, cache_put, cache_key, document_hash
+from document_index import DocumentIndex
+from corpus_store import current_store
+from obsolescence import resolve_supersession, supersession_insights
+from graph_analytics import connected_components, detect_communities, annotate_centrality, CLUSTER_MODE
+from embedding_store import save_json
 
 load_dotenv()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
+# Configure Gemini (LLM_BACKEND=stub swaps in a local model)
 api_model = os.getenv("GEMINI_MODEL")
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(api_model)
+model = create_model(api_model)
+
+# Bump when the contradiction prompt changes so cached answers are not reused
+CONTRADICTION_PROMPT_VERSION = "contradiction-v1"
 
 def load_graph():
     """Load the generated graph.json"""
@@ -27,7 +34,9 @@ def load_documents():
         return json.load(f)
 
 def get_doc_by_id(documents, doc_id):
-    """Helper to find document by ID"""
+    """Helper to find document by ID (O(1) when given a DocumentIndex or CorpusStore)"""
+    if not isinstance(documents, list):
+        return documents.get(doc_id)
     for doc in documents:
         if doc['id'] == doc_id:
             return doc
@@ -55,6 +64,11 @@ def extract_contradiction_details(doc1, doc2):
     """
     Use Gemini to extract specific claims that contradict each other
     """
+    key = cache_key(api_model, CONTRADICTION_PROMPT_VERSION, document_hash(doc1), document_hash(doc2))
+    cached = cache_get(key)
+    if cached:
+        return cached
+
     prompt = f"""Analyze these two documents that contradict each other.
 
 Document 1 ({doc1['title']}, {doc1['date']}):
@@ -75,61 +89,36 @@ Return this exact JSON format:
 }}"""
 
     try:
-        response = model.generate_content(prompt)
+        text = generate(model, prompt).strip()
 
         # Clean response text
-        text = response.text.strip()
         if text.startswith('```'):
             text = text.split('```')[1]
             if text.startswith('json'):
                 text = text[4:].strip()
 
-        result = json.loads(text)
-        return _normalize_contradiction_result(result)
+        result = _normalize_contradiction_result(json.loads(text))
+        cache_put(key, "contradiction", result)
+        return result
 
     except Exception as e:
         print(f"  API Error: {e}")
         return _normalize_contradiction_result({})
 
-def detect_clusters(graph, documents):
+def detect_clusters(graph, mode=None):
     """
     Detect clusters of related documents based on edges
-    Returns clusters as groups of connected nodes
+    mode (default CLUSTER_MODE): "components" = connected components (union-find),
+    "communities" = weighted label propagation, which also splits large components
+    Returns clusters as groups of node ids (single nodes are not clusters)
     """
-    # Build adjacency list
-    adjacency = {}
-    for edge in graph['edges']:
-        src = edge['source']
-        tgt = edge['target']
-
-        if src not in adjacency:
-            adjacency[src] = []
-        if tgt not in adjacency:
-            adjacency[tgt] = []
-
-        adjacency[src].append(tgt)
-        adjacency[tgt].append(src)
-
-    # Find connected components (simple DFS)
-    visited = set()
-    clusters = []
-
-    def dfs(node, cluster):
-        visited.add(node)
-        cluster.append(node)
-        for neighbor in adjacency.get(node, []):
-            if neighbor not in visited:
-                dfs(neighbor, cluster)
-
-    for node in graph['nodes']:
-        node_id = node['id']
-        if node_id not in visited:
-            cluster = []
-            dfs(node_id, cluster)
-            if len(cluster) > 1:  # Only count actual clusters
-                clusters.append(cluster)
+    mode = mode or CLUSTER_MODE
+    if mode == "communities":
+        groups = detect_communities(graph)
+    else:
+        groups = connected_components(graph)
 
-    return clusters
+    return [group for group in groups if len(group) > 1]  # Only count actual clusters
 
 def calculate_impact_scores(graph):
     """
@@ -154,23 +143,33 @@ def calculate_impact_scores(graph):
 
     return impact
 
-def analyze_graph(max_contradictions=5):
+def analyze_graph(max_contradictions=5, graph=None, documents=None, doc_index=None):
     """
     Main analysis function:
     1. Find contradictions and extract details
-    2. Detect obsolete documents from 'updates' relationships
+    2. Detect obsolete documents from 'updates' relationships, resolved
+       transitively to the current version of each chain
     3. Detect document clusters
-    4. Calculate impact scores
+    4. Calculate impact scores and centrality measures
     5. Add insights to graph
+    graph/documents can be passed in-memory (pipeline.py); otherwise loaded from disk
+    doc_index: DocumentIndex over documents, or a CorpusStore (then documents
+    are not loaded at all); built here if not passed
     """
 
     print("Transmute - Graph Analysis")
     print("=" * 60)
 
     # Load data
-    print("\nLoading graph and documents...")
-    graph = load_graph()
-    documents = load_documents()
+    if graph is None or (documents is None and doc_index is None):
+        print("\nLoading graph and documents...")
+        graph = graph if graph is not None else load_graph()
+        if documents is None and doc_index is None:
+            documents = load_documents()
+
+    # Every lookup below goes through the index instead of scanning documents
+    if doc_index is None:
+        doc_index = DocumentIndex(documents)
 
     insights = []
 
@@ -181,15 +180,22 @@ def analyze_graph(max_contradictions=5):
     if contradiction_edges:
         print(f"Found {len(contradiction_edges)} contradiction(s)")
 
-        # Limit to top N for speed
-        for idx, edge in enumerate(contradiction_edges[:max_contradictions]):
-            doc1 = get_doc_by_id(documents, edge['source'])
-            doc2 = get_doc_by_id(documents, edge['target'])
+        # Limit to top N for speed; extract details concurrently
+        selected = contradiction_edges[:max_contradictions]
+        print(f"  Extracting conflict details for {len(selected)}...")
+        all_details = run_concurrently(
+            lambda edge: extract_contradiction_details(
+                get_doc_by_id(doc_index, edge['source']),
+                get_doc_by_id(doc_index, edge['target'])
+            ),
+            selected
+        )
+
+        for idx, (edge, details) in enumerate(zip(selected, all_details)):
+            doc1 = get_doc_by_id(doc_index, edge['source'])
+            doc2 = get_doc_by_id(doc_index, edge['target'])
 
             print(f"\n  {idx+1}. {doc1['title']} vs {doc2['title']}")
-            print(f"     Extracting conflict details...")
-
-            details = extract_contradiction_details(doc1, doc2)
 
             insight = {
                 "type": "contradiction",
@@ -212,43 +218,59 @@ def analyze_graph(max_contradictions=5):
 
     # --- DETECT OBSOLETE DOCUMENTS ---
     print("\n[OBSOLESCENCE]")
-    update_edges = [e for e in graph['edges'] if e['type'] == 'updates']
+    # Updates edges oriented by date and resolved into chains (A -> B -> C) with current heads
+    resolution = resolve_supersession(graph, doc_index)
 
-    if update_edges:
-        print(f"Found {len(update_edges)} update relationship(s)")
+    if resolution['updates']:
+        print(f"Found {len(resolution['updates'])} update relationship(s)")
 
-        for edge in update_edges:
-            doc_new = get_doc_by_id(documents, edge['source'])
-            doc_old = get_doc_by_id(documents, edge['target'])
+        for new_id, old_id, edge in resolution['updates']:
+            doc_new = get_doc_by_id(doc_index, new_id)
+            doc_old = get_doc_by_id(doc_index, old_id)
+            doc_current = get_doc_by_id(doc_index, resolution['head'][old_id])
 
             print(f"\n  Obsolete: {doc_old['title']} ({doc_old['date']})")
             print(f"  Superseded by: {doc_new['title']} ({doc_new['date']})")
+            if doc_current['id'] != new_id:
+                print(f"  Current version: {doc_current['title']} ({doc_current['date']})")
 
             insight = {
                 "type": "obsolete",
-                "nodes": [edge['source'], edge['target']],
-                "obsolete_doc": edge['target'],
+                "nodes": [new_id, old_id],
+                "obsolete_doc": old_id,
                 "obsolete_title": doc_old['title'],
                 "obsolete_date": doc_old['date'],
-                "superseded_by": edge['source'],
+                "superseded_by": new_id,
                 "superseded_title": doc_new['title'],
                 "superseded_date": doc_new['date'],
+                "current_version": doc_current['id'],
+                "current_title": doc_current['title'],
                 "reason": edge['explanation']
             }
 
             insights.append(insight)
+
+        chains = supersession_insights(resolution, doc_index)
+        print(f"\n  {len(chains)} supersession chain(s), longest: {max(c['chain_length'] for c in chains)} documents")
+        insights.extend(chains)
     else:
         print("  No obsolete documents detected")
 
+    # Point superseded nodes at their latest authoritative version
+    for node in graph['nodes']:
+        node.pop('current_version', None)
+        if node['id'] in resolution['head']:
+            node['current_version'] = resolution['head'][node['id']]
+
     # --- DETECT CLUSTERS ---
     print("\n[CLUSTERS]")
-    clusters = detect_clusters(graph, documents)
+    clusters = detect_clusters(graph)
 
     if clusters:
         print(f"Found {len(clusters)} document cluster(s)")
 
         for idx, cluster in enumerate(clusters):
-            cluster_docs = [get_doc_by_id(documents, doc_id) for doc_id in cluster]
+            cluster_docs = [get_doc_by_id(doc_index, doc_id) for doc_id in cluster]
             cluster_titles = [doc['title'] for doc in cluster_docs if doc]
 
             print(f"\n  Cluster {idx+1}: {len(cluster)} documents")
@@ -275,7 +297,7 @@ def analyze_graph(max_contradictions=5):
 
     print("Most connected/impactful documents:")
     for doc_id, score in top_impact:
-        doc = get_doc_by_id(documents, doc_id)
+        doc = get_doc_by_id(doc_index, doc_id)
         if doc and score > 0:
             print(f"  - {doc['title']}: {score} connections")
 
@@ -283,11 +305,22 @@ def analyze_graph(max_contradictions=5):
     for node in graph['nodes']:
         node['impact_score'] = impact_scores.get(node['id'], 0)
 
+    # Structural centrality (weighted degree, PageRank, betweenness, k-core) from one sparse adjacency
+    centrality = annotate_centrality(graph)
+    top_central = sorted(centrality.items(), key=lambda x: x[1]['pagerank'], reverse=True)[:3]
+    print("Most central documents (PageRank):")
+    for doc_id, measures in top_central:
+        doc = get_doc_by_id(doc_index, doc_id)
+        if doc and measures['weighted_degree'] > 0:
+            print(f"  - {doc['title']}: {measures['pagerank']:.4f} "
+                  f"(betweenness {measures['betweenness']:.3f}, core {measures['core_number']})")
+
     # --- SAVE ENHANCED GRAPH ---
     print("\n" + "=" * 60)
     print(f"[INSIGHTS] Generated {len(insights)} insights")
     print(f"  - Contradictions: {len([i for i in insights if i['type'] == 'contradiction'])}")
     print(f"  - Obsolete docs: {len([i for i in insights if i['type'] == 'obsolete'])}")
+    print(f"  - Supersession chains: {len([i for i in insights if i['type'] == 'supersession'])}")
     print(f"  - Clusters: {len([i for i in insights if i['type'] == 'cluster'])}")
 
     # Add insights to graph
@@ -298,8 +331,7 @@ def analyze_graph(max_contradictions=5):
     graph['metadata']['most_impactful'] = sorted_impact[0][0] if sorted_impact and sorted_impact[0][1] > 0 else None
 
     # Save enhanced graph
-    with open('graph.json', 'w') as f:
-        json.dump(graph, f, indent=2)
+    save_json('graph.json', graph)
 
     print("\n[SAVED] Enhanced graph.json with insights")
     print("[READY] Graph is ready for frontend visualization!")
@@ -307,5 +339,5 @@ def analyze_graph(max_contradictions=5):
     return graph
 
 if __name__ == "__main__":
-    # Run analysis
-    analyze_graph(max_contradictions=5)
+    # Run analysis (document lookups go to the corpus store when it is current)
+    analyze_graph(max_contradictions=5, doc_index=current_store('documents.json'))
@@ -3,119 +3,358 @@ Transmute - Flask API
 Serves knowledge graph data to frontend
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import json
 import os
+import shutil
 
 # Import wiki and chatbot functions
-from generate_wiki import generate_wiki_summary, load_graph, load_documents
+from generate_wiki import generate_wiki_summary
 from chatbot import answer_question
-from upload_processor import process_upload
+from upload_processor import process_upload, save_upload
+from jobs import job_manager, JobQueueFull
+from corpus_cache import corpus_cache, GRAPH_FILE, DOCUMENTS_FILE, METRICS_FILE
+from http_cache import conditional, compress_response
+from summary import filter_insights, insight_positions
+from columnar import read_records, to_records
+from dedup import DUPLICATES_FILE
+from embedding_store import replace_file
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend access
+CORS(app, expose_headers=['X-Total-Count'])  # Enable CORS for frontend access
 
 # Configure upload settings
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
+# gzip/brotli JSON responses by Accept-Encoding
+app.after_request(compress_response)
+
+# Fields never sent unless asked for by name in ?fields= (nothing in the frontend uses them)
+HIDDEN_FIELDS = {'embedding'}
+
+# Fields ?fields= / ?exclude= may name: what ingest/upload write on documents,
+# and what build_graph/analyze write on graph nodes
+DOCUMENT_FIELDS = {'id', 'title', 'date', 'content', 'word_count', 'filename', 'source_path',
+                   'size_bytes', 'content_hash', 'embedding'}
+NODE_FIELDS = {'id', 'label', 'date', 'content', 'word_count', 'content_hash', 'impact_score',
+               'current_version', 'weighted_degree', 'pagerank', 'betweenness', 'core_number'}
+
+# What to run when an artifact is missing
+MISSING_ARTIFACTS = {
+    GRAPH_FILE: "Graph not found. Run analyze.py first.",
+    DOCUMENTS_FILE: "Documents not found. Run ingest.py first."
+}
+
+def _missing_artifact(error):
+    """404 response naming the artifact whose absence raised the FileNotFoundError"""
+    path = error.filename or str(error)
+    return jsonify({"error": MISSING_ARTIFACTS.get(path, f"{path} not found.")}), 404
+
+def _csv_arg(name):
+    value = request.args.get(name)
+    return [part.strip() for part in value.split(',') if part.strip()] if value else None
+
+def _field_args():
+    """(fields, exclude) from ?fields= / ?exclude=; fields is None when absent"""
+    fields = _csv_arg('fields')
+    exclude = set(_csv_arg('exclude') or []) | (HIDDEN_FIELDS - set(fields or []))
+    return fields, exclude
+
+def _check_fields(known):
+    """Raises ValueError if ?fields= / ?exclude= name a field outside known"""
+    unknown = sorted((set(_csv_arg('fields') or []) | set(_csv_arg('exclude') or [])) - known)
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+
+def _projection():
+    """
+    Field selection from the query string:
+    ?fields=id,title,date keeps only those fields, ?exclude=content drops fields.
+    Returns a function mapping a record to its projected copy.
+    """
+    fields, exclude = _field_args()
+
+    def project(record):
+        if fields:
+            return {key: record[key] for key in fields if key in record and key not in exclude}
+        return {key: value for key, value in record.items() if key not in exclude}
+    return project
+
+def _page_args():
+    """
+    (offset, limit) from the query string; limit is None when absent.
+    Raises ValueError for malformed or negative values.
+    """
+    offset = int(request.args.get('offset', 0))
+    limit = request.args.get('limit')
+    limit = int(limit) if limit is not None else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset and limit must be non-negative")
+    return offset, limit
+
+def _page(items, offset, limit):
+    """offset/limit slice of items, plus the unpaged total"""
+    end = offset + limit if limit is not None else None
+    return items[offset:end], len(items)
+
+def _columns(dataset):
+    """Columns a columnar read needs for the request's ?fields= / ?exclude= (projection pushdown)"""
+    fields, exclude = _field_args()
+    return [name for name in (fields or dataset.schema.names) if name not in exclude]
+
+def _columnar_graph(nodes_dataset, offset, limit):
+    """Nodes page, its edges and the other graph keys, read from the columnar tables"""
+    nodes, total = read_records(nodes_dataset, _columns(nodes_dataset), offset=offset, limit=limit)
+
+    filters = None
+    if len(nodes) != total:
+        page_ids, _ = read_records(nodes_dataset, ['id'], offset=offset, limit=limit)
+        filters = [('source', 'in', [node['id'] for node in page_ids])]
+    edges, _ = read_records(corpus_cache.columnar('edges'), filters=filters)
+
+    insights, _ = read_records(corpus_cache.columnar('insights'))
+    extra = {**corpus_cache.columnar_manifest()['graph_extra'], "insights": insights}
+    return nodes, total, edges, extra
+
+def _wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def _stream_json_array(items, project):
+    """Streamed JSON array, serialized one record at a time (full exports)"""
+    def generate():
+        yield '['
+        for idx, item in enumerate(items):
+            yield (',' if idx else '') + json.dumps(project(item))
+        yield ']'
+    return generate()
+
 # API Routes
 
 @app.route('/api/graph', methods=['GET'])
+@conditional(GRAPH_FILE)
 def get_graph():
-    """Return the complete knowledge graph with insights"""
+    """
+    Return the knowledge graph with insights
+    ?fields= / ?exclude= project node fields (e.g. ?exclude=content)
+    ?offset=&limit= page through nodes; each page carries the edges whose
+    source is on it, so the pages together hold every edge exactly once
+    ?stream=1 streams the response instead of building it in memory
+    """
     try:
-        with open('graph.json', 'r') as f:
-            graph = json.load(f)
-        return jsonify(graph)
+        offset, limit = _page_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination: {str(e)}"}), 400
+    try:
+        _check_fields(NODE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
+
+    try:
+        project = _projection()
+        nodes_dataset = corpus_cache.columnar('nodes')
+        if nodes_dataset is not None:
+            nodes, total, edges, extra = _columnar_graph(nodes_dataset, offset, limit)
+        else:
+            graph = corpus_cache.graph()
+            nodes, total = _page(graph['nodes'], offset, limit)
+            edges = graph['edges']
+            if len(nodes) != total:
+                page_ids = {node['id'] for node in nodes}
+                edges = [edge for edge in edges if edge['source'] in page_ids]
+            extra = {key: value for key, value in graph.items() if key not in ('nodes', 'edges')}
     except FileNotFoundError:
         return jsonify({"error": "Graph not found. Run build_graph.py first."}), 404
 
+    if _wants_stream():
+        def generate():
+            yield '{"nodes": '
+            yield from _stream_json_array(nodes, project)
+            yield ', "edges": '
+            yield from _stream_json_array(edges, lambda edge: edge)
+            for key, value in extra.items():
+                yield f', {json.dumps(key)}: {json.dumps(value)}'
+            yield '}'
+        return Response(generate(), mimetype='application/json', headers={'X-Total-Count': str(total)})
+
+    response = jsonify({"nodes": [project(node) for node in nodes], "edges": edges, **extra})
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
 @app.route('/api/documents', methods=['GET'])
+@conditional(DOCUMENTS_FILE)
 def get_documents():
-    """Return all processed documents"""
+    """
+    Return processed documents (raw embeddings are never included)
+    ?fields=id,title,date / ?exclude=content project fields
+    ?offset=&limit= page through documents (total in X-Total-Count)
+    ?from=2024-04&to=2024-06 only documents dated in that range (ISO prefixes, end inclusive)
+    ?stream=1 streams the response instead of building it in memory
+    """
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        offset, limit = _page_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination: {str(e)}"}), 400
+    try:
+        _check_fields(DOCUMENT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
+
     try:
-        with open('documents.json', 'r') as f:
-            documents = json.load(f)
-        return jsonify(documents)
+        project = _projection()
+        dataset = corpus_cache.columnar('documents')
+        store = corpus_cache.corpus_store(DOCUMENTS_FILE) if start or end else None
+        if store is not None:
+            # Date index of the corpus store: only the page is read, already projected
+            fields, exclude = _field_args()
+            documents = store.between(start, end, offset, limit, fields, sorted(exclude))
+            total = store.count_between(start, end)
+        elif start or end:
+            documents, total = _page(corpus_cache.document_index().between(start, end), offset, limit)
+        elif dataset is not None:
+            documents, total = read_records(dataset, _columns(dataset), offset=offset, limit=limit)
+        else:
+            documents, total = _page(corpus_cache.documents(), offset, limit)
     except FileNotFoundError:
         return jsonify({"error": "Documents not found. Run ingest.py first."}), 404
 
+    if _wants_stream():
+        return Response(_stream_json_array(documents, project), mimetype='application/json',
+                        headers={'X-Total-Count': str(total)})
+
+    response = jsonify([project(doc) for doc in documents])
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+@app.route('/api/documents/<doc_id>', methods=['GET'])
+@conditional(DOCUMENTS_FILE)
+def get_document(doc_id):
+    """Return one document by id (?fields= / ?exclude= project fields)"""
+    try:
+        _check_fields(DOCUMENT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
+
+    try:
+        store = corpus_cache.corpus_store(DOCUMENTS_FILE)
+        dataset = corpus_cache.columnar('documents')
+        if store is not None:
+            doc = store.get(doc_id)
+        elif dataset is not None:
+            matches, _ = read_records(dataset, _columns(dataset), filters=[('id', '==', doc_id)])
+            doc = matches[0] if matches else None
+        else:
+            doc = corpus_cache.document_index().get(doc_id)
+    except FileNotFoundError:
+        return jsonify({"error": "Documents not found. Run ingest.py first."}), 404
+
+    if doc is None:
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify(_projection()(doc))
+
+@app.route('/api/documents/<doc_id>/edges', methods=['GET'])
+@conditional(GRAPH_FILE)
+def get_document_edges(doc_id):
+    """Return the edges touching one document (?type= filters by relationship type)"""
+    edge_type = request.args.get('type')
+    try:
+        store = corpus_cache.corpus_store(GRAPH_FILE)
+        if store is not None:
+            edges = store.edges(edge_type=edge_type, touching=doc_id)
+        else:
+            edges = [
+                edge for edge in corpus_cache.graph()['edges']
+                if doc_id in (edge['source'], edge['target']) and (edge_type is None or edge['type'] == edge_type)
+            ]
+    except FileNotFoundError:
+        return jsonify({"error": "Graph not found. Run build_graph.py first."}), 404
+    return jsonify(edges)
+
 @app.route('/api/insights', methods=['GET'])
+@conditional(GRAPH_FILE)
 def get_insights():
-    """Return only the insights (contradictions + obsolete docs)"""
+    """
+    Return only the insights (contradictions + obsolete docs + supersession chains)
+    ?type=contradiction and/or ?node=<doc id> filter via the summary indexes;
+    ?type=supersession&node=<doc id> gives the current version of a document
+    """
+    insight_type, node_id = request.args.get('type'), request.args.get('node')
     try:
-        with open('graph.json', 'r') as f:
-            graph = json.load(f)
-        insights = graph.get('insights', [])
-        return jsonify({
-            "insights": insights,
-            "stats": {
-                "total": len(insights),
-                "contradictions": len([i for i in insights if i['type'] == 'contradiction']),
-                "obsolete": len([i for i in insights if i['type'] == 'obsolete'])
-            }
-        })
-    except FileNotFoundError:
-        return jsonify({"error": "Graph not found. Run analyze.py first."}), 404
+        summary = corpus_cache.summary()
+        store = corpus_cache.corpus_store(GRAPH_FILE)
+        dataset = corpus_cache.columnar('insights')
+        if store is not None:
+            insights = store.insights(insight_type, node_id)
+        elif dataset is not None:
+            # Read just the matching rows, located by the summary's indexes
+            positions = insight_positions(summary, insight_type, node_id)
+            insights = to_records(dataset.to_table() if positions is None else dataset.take(positions))
+        else:
+            insights = filter_insights(corpus_cache.graph().get('insights', []), summary, insight_type, node_id)
+    except FileNotFoundError as e:
+        # The summary needs documents.json as well as graph.json
+        return _missing_artifact(e)
+
+    stats = summary['stats']['insights']
+    return jsonify({
+        "insights": insights,
+        "stats": {
+            "total": stats['total'],
+            "contradictions": stats['contradictions'],
+            "obsolete": stats['obsolete'],
+            "supersession_chains": stats['by_type'].get('supersession', 0)
+        }
+    })
 
 @app.route('/api/stats', methods=['GET'])
+@conditional(GRAPH_FILE, DOCUMENTS_FILE)
 def get_stats():
-    """Return overall statistics"""
+    """Return overall statistics (precomputed in summary.json)"""
     try:
-        with open('graph.json', 'r') as f:
-            graph = json.load(f)
-        with open('documents.json', 'r') as f:
-            documents = json.load(f)
-
-        # Calculate statistics
-        total_words = sum(doc['word_count'] for doc in documents)
-        relationship_counts = {}
-        for edge in graph['edges']:
-            rel_type = edge['type']
-            relationship_counts[rel_type] = relationship_counts.get(rel_type, 0) + 1
-
-        return jsonify({
-            "documents": {
-                "total": len(documents),
-                "total_words": total_words,
-                "avg_words": total_words // len(documents) if documents else 0
-            },
-            "relationships": {
-                "total": len(graph['edges']),
-                "by_type": relationship_counts
-            },
-            "insights": {
-                "total": len(graph.get('insights', [])),
-                "contradictions": len([i for i in graph.get('insights', []) if i['type'] == 'contradiction']),
-                "obsolete": len([i for i in graph.get('insights', []) if i['type'] == 'obsolete'])
-            }
-        })
+        return jsonify(corpus_cache.summary()['stats'])
     except FileNotFoundError as e:
-        return jsonify({"error": str(e)}), 404
+        return _missing_artifact(e)
 
 @app.route('/api/metrics', methods=['GET'])
+@conditional(METRICS_FILE)
 def get_metrics():
     """Return sustainability metrics (cognitive load, storage savings)"""
     try:
-        with open('metrics.json', 'r') as f:
-            metrics = json.load(f)
-        return jsonify(metrics)
+        return jsonify(corpus_cache.metrics())
     except FileNotFoundError:
         return jsonify({"error": "Metrics not found. Run metrics.py first."}), 404
 
+@app.route('/api/duplicates', methods=['GET'])
+@conditional(DUPLICATES_FILE)
+def get_duplicates():
+    """Return exact and near-duplicate document groups (?kind=exact|near)"""
+    try:
+        duplicates = corpus_cache.duplicates()
+    except FileNotFoundError:
+        return jsonify({"error": "Duplicates not found. Run dedup.py first."}), 404
+
+    kind = request.args.get('kind')
+    if kind is None:
+        return jsonify(duplicates)
+    return jsonify({
+        **duplicates,
+        "groups": [group for group in duplicates['groups'] if group['kind'] == kind],
+        "pairs": [pair for pair in duplicates['pairs'] if pair['kind'] == kind]
+    })
+
 @app.route('/api/wiki/generate', methods=['POST'])
 def generate_wiki():
     """Generate Wikipedia-style summary from graph"""
     try:
-        graph = load_graph()
-        documents = load_documents()
+        graph = corpus_cache.graph()
+        store = corpus_cache.corpus_store(DOCUMENTS_FILE)
+        doc_index = store if store is not None else corpus_cache.document_index()
 
-        wiki_content = generate_wiki_summary(graph, documents)
+        wiki_content = generate_wiki_summary(graph, doc_index=doc_index)
 
         # Save to file
-        with open('wiki.md', 'w', encoding='utf-8') as f:
-            f.write(wiki_content)
+        replace_file('wiki.md', lambda f: f.write(wiki_content), mode='w')
 
         return jsonify({
             'content': wiki_content,
@@ -147,8 +386,10 @@ def chat():
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """
-    Upload and process ZIP file containing documents
-    Runs complete pipeline: ingest → build_graph → analyze → metrics
+    Upload ZIP file containing documents and queue it for processing
+    Runs complete pipeline in the background: ingest → build_graph → analyze → metrics
+    Returns 202 with a job id; poll /api/jobs/<job_id> for progress
+    ?mode=incremental re-embeds only files added or changed since the last upload
     """
     try:
         # Check if file is present
@@ -164,17 +405,32 @@ def upload_file():
         if not file.filename.lower().endswith('.zip'):
             return jsonify({'error': 'Only ZIP files are supported'}), 400
 
-        # Process the upload
-        result = process_upload(file)
+        # Queue the upload; the worker pool runs the pipeline
+        upload_dir = save_upload(file)
+        try:
+            incremental = request.args.get('mode') == 'incremental'
+            job = job_manager.submit('upload', process_upload, upload_dir, incremental)
+        except JobQueueFull:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            return jsonify({'error': 'Too many uploads in progress, try again shortly'}), 503
 
-        if 'error' in result:
-            return jsonify(result), 400
-
-        return jsonify(result), 200
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
 
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and per-stage progress of a background job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -191,12 +447,16 @@ def index():
         "service": "Transmute API",
         "version": "1.0.0",
         "endpoints": {
-            "/api/upload": "Upload ZIP file and process documents (POST)",
-            "/api/graph": "Get complete knowledge graph with insights",
-            "/api/documents": "Get all processed documents",
-            "/api/insights": "Get contradictions and obsolete documents",
+            "/api/upload": "Upload ZIP file and process documents in the background (POST)",
+            "/api/jobs/<job_id>": "Get upload job status and progress",
+            "/api/graph": "Get knowledge graph with insights (?fields=, ?exclude=, ?offset=&limit=, ?stream=1)",
+            "/api/documents": "Get processed documents (?fields=, ?exclude=, ?offset=&limit=, ?from=&to=, ?stream=1)",
+            "/api/documents/<doc_id>": "Get one document by id",
+            "/api/documents/<doc_id>/edges": "Get the relationships touching one document (?type=)",
+            "/api/insights": "Get contradictions and obsolete documents (?type=, ?node=)",
             "/api/stats": "Get overall statistics",
             "/api/metrics": "Get sustainability metrics",
+            "/api/duplicates": "Get exact and near-duplicate document groups (?kind=)",
             "/api/wiki/generate": "Generate Wikipedia-style summary (POST)",
             "/api/wiki/chat": "Ask questions about documents (POST)",
             "/api/health": "Health check"
@@ -209,12 +469,16 @@ if __name__ == '__main__':
     print("=" * 60)
     print("Starting server on http://localhost:5000")
     print("\nAvailable endpoints:")
-    print("  - POST /api/upload        - Upload ZIP file (complete pipeline)")
+    print("  - POST /api/upload        - Upload ZIP file (background pipeline job)")
+    print("  - GET  /api/jobs/<id>     - Upload job status & progress")
     print("  - GET  /api/graph         - Complete knowledge graph")
     print("  - GET  /api/documents     - All documents")
+    print("  - GET  /api/documents/<id> - One document")
+    print("  - GET  /api/documents/<id>/edges - Relationships of one document")
     print("  - GET  /api/insights      - Contradictions & obsolete docs")
     print("  - GET  /api/stats         - Statistics")
     print("  - GET  /api/metrics       - Sustainability metrics")
+    print("  - GET  /api/duplicates    - Duplicate document groups")
     print("  - POST /api/wiki/generate - Generate wiki summary")
     print("  - POST /api/wiki/chat     - Chat with documents")
     print("  - GET  /api/health        - Health check")
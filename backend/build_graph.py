@@ -1,18 +1,21 @@
 import json
 import os
+import sys
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
-import google.generativeai as genai
+from embedding_store import embeddings_for, save_json
+from llm_executor import create_model, generate, run_concurrently
+from llm_cache import cache_get, cache_put, cache_key, document_hash
 
 load_dotenv()
 
-api_key = os.getenv("GEMINI_API_KEY")
 api_model = os.getenv("GEMINI_MODEL")
 
-# Configure Gemini
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(api_model)
+# Configure Gemini (LLM_BACKEND=stub swaps in a local model)
+model = create_model(api_model)
+
+# Bump when the relationship prompt changes so cached answers are not reused
+RELATIONSHIP_PROMPT_VERSION = "relationship-v1"
 
 ################################################
 # Loading files
@@ -24,14 +27,100 @@ def load_documents():
         documents = json.load(f)
     return documents
 
-"""Compute cosine similarity between all document embeddings"""
-def compute_similarity_matrix(documents):
-    embeddings = np.array([doc['embedding'] for doc in documents])
-    similarity_matrix = cosine_similarity(embeddings)
-    return similarity_matrix
+def _select_top_pairs(pairs, similarities, max_edges, num_docs, dedupe):
+    """Keep the max_edges most similar (i, j) pairs, most similar first"""
+    if dedupe and len(pairs):
+        keys = pairs[:, 0] * num_docs + pairs[:, 1]
+        _, first = np.unique(keys, return_index=True)
+        pairs, similarities = pairs[first], similarities[first]
+
+    if max_edges is not None and len(similarities) > max_edges:
+        keep = np.argpartition(-similarities, max_edges - 1)[:max_edges]
+        pairs, similarities = pairs[keep], similarities[keep]
+
+    # Most similar first; ties broken by document order for stable output
+    order = np.lexsort((pairs[:, 1], pairs[:, 0], -similarities))
+    return pairs[order], similarities[order]
+
+def find_edge_candidates(embeddings, similarity_threshold=0.5, max_edges=15,
+                         max_neighbors=None, block_elements=4_000_000, rows=None):
+    """
+    Select the most similar document pairs without building the n x n matrix.
+
+    Rows are scored in blocks of at most block_elements similarities, and only
+    the running top max_edges pairs are kept between blocks, so peak memory is
+    bounded by the block size rather than the corpus size.
+
+    Args:
+        embeddings: Matrix with one row per document
+        similarity_threshold: Minimum cosine similarity for a candidate
+        max_edges: Keep only this many pairs overall (None keeps all)
+        max_neighbors: Optional per-document limit: a pair qualifies only if
+            one end is among the other's max_neighbors nearest documents
+        rows: Optional document indices; only pairs touching these are scored
+            (incremental updates recompute just the affected rows)
+
+    Returns:
+        (pairs, similarities): int array of (i, j) with i < j, and their similarities
+    """
+    vectors = np.asarray(embeddings, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+
+    num_docs = len(vectors)
+    block_size = max(1, block_elements // max(num_docs, 1))
+    columns = np.arange(num_docs)
+
+    # A subset of rows may pair with any column, so pairs can repeat across rows
+    subset = rows is not None
+    scan_rows = np.asarray(sorted(rows), dtype='int64') if subset else columns
+
+    kept_pairs = np.empty((0, 2), dtype='int64')
+    kept_similarities = np.empty(0, dtype='float32')
+
+    for start in range(0, len(scan_rows), block_size):
+        block_doc_rows = scan_rows[start:start + block_size]
+        local = np.arange(len(block_doc_rows))
+        block = vectors[block_doc_rows] @ vectors.T
+
+        if max_neighbors:
+            # Each row keeps its own k nearest neighbours (excluding itself)
+            block[local, block_doc_rows] = -np.inf
+            k = min(max_neighbors, num_docs - 1)
+            if k <= 0:
+                continue
+            block_rows = np.repeat(local, k)
+            block_cols = np.argpartition(-block, k - 1, axis=1)[:, :k].ravel()
+        elif subset:
+            block[local, block_doc_rows] = -np.inf
+            block_rows, block_cols = np.nonzero(block > similarity_threshold)
+        else:
+            # Upper triangle only: each unordered pair is scored once
+            block[columns[None, :] <= block_doc_rows[:, None]] = -np.inf
+            block_rows, block_cols = np.nonzero(block > similarity_threshold)
+
+        similarities = block[block_rows, block_cols]
+        above = similarities > similarity_threshold
+        sources = block_doc_rows[block_rows[above]]
+        targets = block_cols[above]
+        pairs = np.stack([np.minimum(sources, targets), np.maximum(sources, targets)], axis=1)
+
+        kept_pairs, kept_similarities = _select_top_pairs(
+            np.concatenate([kept_pairs, pairs]),
+            np.concatenate([kept_similarities, similarities[above]]),
+            max_edges, num_docs, dedupe=bool(max_neighbors) or subset
+        )
+
+    return kept_pairs, kept_similarities
 
 """Uses Gemini to determine relationship type between two documents"""
 def get_relationship_type(doc1, doc2):
+    key = cache_key(api_model, RELATIONSHIP_PROMPT_VERSION, document_hash(doc1), document_hash(doc2))
+    cached = cache_get(key)
+    if cached:
+        return cached['relationship'], cached['explanation']
+
     content1 = doc1['content']
     content2 = doc2['content']
 
@@ -55,10 +144,10 @@ Return this exact JSON format:
 {{"relationship": "contradicts", "explanation": "one sentence"}}"""
 
     try:
-        response = model.generate_content(prompt)
+        # Rate-limited, retried call shared with every other pipeline stage
+        text = generate(model, prompt).strip()
 
         # Clean response text (remove markdown code blocks if present)
-        text = response.text.strip()
         if text.startswith('```'):
             # Extract JSON from markdown code block
             text = text.split('```')[1]
@@ -67,70 +156,44 @@ Return this exact JSON format:
 
         # Parse JSON from response
         result = json.loads(text)
+        cache_put(key, "relationship", {
+            "relationship": result['relationship'],
+            "explanation": result['explanation']
+        })
         return result['relationship'], result['explanation']
 
     except Exception as e:
         print(f"API Error: {e}")
         return "relates_to", "Documents share common topics"
     
-def build_graph(similarity_threshold=0.5, max_edges=15):
-    """Build knowledge graph from documents"""
+def build_graph(similarity_threshold=0.5, max_edges=15, max_neighbors=None, documents=None, embeddings=None,
+                progress=None):
+    """
+    Build knowledge graph from documents
+    documents/embeddings can be passed in-memory (pipeline.py); otherwise loaded from disk
+    progress: Optional callback(stage=..., **counters) for job status reporting
+    """
     
-    print("Loading documents...")
-    documents = load_documents()
+    if documents is None:
+        print("Loading documents...")
+        documents = load_documents()
+    if embeddings is None:
+        embeddings = embeddings_for(documents)
     
-    print("Computing similarity matrix...")
-    similarity_matrix = compute_similarity_matrix(documents)
+    print("Selecting candidate edges...")
+    pairs, similarities = find_edge_candidates(
+        embeddings,
+        similarity_threshold=similarity_threshold,
+        max_edges=max_edges,
+        max_neighbors=max_neighbors
+    )
     
-    # Create nodes
-    nodes = []
-    for doc in documents:
-        nodes.append({
-            "id": doc['id'],
-            "label": doc['title'],
-            "date": doc['date'],
-            "content": doc['content'],
-            "word_count": doc['word_count']
-        })
+    nodes = [make_node(doc) for doc in documents]
     
-    # Find top edges based on similarity
-    edges = []
-    edge_candidates = []
+    # Top edges by similarity (already sorted, most similar first)
+    top_edges = _candidate_edges(documents, pairs, similarities)
     
-    for i in range(len(documents)):
-        for j in range(i + 1, len(documents)):
-            similarity = similarity_matrix[i][j]
-            if similarity > similarity_threshold:
-                edge_candidates.append({
-                    'source': documents[i]['id'],
-                    'target': documents[j]['id'],
-                    'similarity': similarity,
-                    'doc1': documents[i],
-                    'doc2': documents[j]
-                })
-    
-    # Sort by similarity and take top N
-    edge_candidates.sort(key=lambda x: x['similarity'], reverse=True)
-    top_edges = edge_candidates[:max_edges]
-    
-    print(f"\nAnalyzing top {len(top_edges)} relationships with Gemini...")
-    
-    # Get relationship types from Gemini
-    for idx, edge_data in enumerate(top_edges):
-        print(f"  {idx+1}/{len(top_edges)}: {edge_data['doc1']['title']} <-> {edge_data['doc2']['title']}")
-        
-        rel_type, explanation = get_relationship_type(
-            edge_data['doc1'], 
-            edge_data['doc2']
-        )
-        
-        edges.append({
-            "source": edge_data['source'],
-            "target": edge_data['target'],
-            "type": rel_type,
-            "explanation": explanation,
-            "similarity": float(edge_data['similarity'])
-        })
+    edges = classify_edges(top_edges, progress=progress)
     
     # Build final graph structure
     graph = {
@@ -143,28 +206,235 @@ def build_graph(similarity_threshold=0.5, max_edges=15):
         }
     }
     
-    # Save to file
-    with open('graph.json', 'w') as f:
-        json.dump(graph, f, indent=2)
-
+    save_graph(graph)
     print(f"\n[SUCCESS] Graph built successfully!")
-    print(f"[GRAPH] Nodes: {len(nodes)}, Edges: {len(edges)}")
+    print_graph_summary(graph)
+    
+    return graph
+
+def make_node(doc):
+    """Graph node for a document"""
+    return {
+        "id": doc['id'],
+        "label": doc['title'],
+        "date": doc['date'],
+        "content": doc['content'],
+        "word_count": doc['word_count'],
+        "content_hash": doc.get('content_hash')
+    }
+
+def classify_edges(top_edges, progress=None):
+    """Classify candidate edges with Gemini (concurrent, rate-limited)"""
+    print(f"\nAnalyzing top {len(top_edges)} relationships with Gemini...")
+    
+    classified = 0
+    if progress:
+        progress(stage="classifying", edges_total=len(top_edges), edges_classified=0)
+
+    def report(idx, edge_data, result):
+        nonlocal classified
+        classified += 1
+        print(f"  {idx+1}/{len(top_edges)}: {edge_data['doc1']['title']} <-> {edge_data['doc2']['title']}")
+        if progress:
+            progress(edges_classified=classified)
+
+    relationships = run_concurrently(
+        lambda edge_data: get_relationship_type(edge_data['doc1'], edge_data['doc2']),
+        top_edges,
+        on_done=report
+    )
+
+    edges = []
+    for edge_data, (rel_type, explanation) in zip(top_edges, relationships):
+        edges.append({
+            "source": edge_data['source'],
+            "target": edge_data['target'],
+            "type": rel_type,
+            "explanation": explanation,
+            "similarity": float(edge_data['similarity'])
+        })
+    return edges
+
+def save_graph(graph):
+    """Save graph.json"""
+    save_json('graph.json', graph)
+
+def print_graph_summary(graph):
+    print(f"[GRAPH] Nodes: {len(graph['nodes'])}, Edges: {len(graph['edges'])}")
     print(f"[SAVED] File: graph.json")
     
     # Print relationship summary
     rel_counts = {}
-    for edge in edges:
+    for edge in graph['edges']:
         rel_counts[edge['type']] = rel_counts.get(edge['type'], 0) + 1
 
     print("\n[RELATIONSHIPS]")
     for rel_type, count in rel_counts.items():
         print(f"  {rel_type}: {count}")
-    
+
+def load_graph():
+    """Load the existing graph.json"""
+    with open('graph.json', 'r') as f:
+        return json.load(f)
+
+def diff_graph(graph, documents):
+    """
+    Work out which documents changed since the graph was built.
+    Nodes record each document's content hash (older graphs: its content).
+
+    Returns:
+        {added, changed, removed}: lists of document ids
+    """
+    nodes_by_id = {node['id']: node for node in graph['nodes']}
+    doc_ids = {doc['id'] for doc in documents}
+
+    added, changed = [], []
+    for doc in documents:
+        node = nodes_by_id.get(doc['id'])
+        if node is None:
+            added.append(doc['id'])
+        elif (node.get('content_hash') or None) != (doc.get('content_hash') or None) \
+                or node.get('content') != doc['content'] \
+                or node.get('label') != doc['title'] or node.get('date') != doc['date']:
+            changed.append(doc['id'])
+
+    removed = [node_id for node_id in nodes_by_id if node_id not in doc_ids]
+    return {"added": added, "changed": changed, "removed": removed}
+
+def _candidate_edges(documents, pairs, similarities):
+    """Candidate edge records for (i, j) document pairs, ready for classify_edges()"""
+    return [{
+        'source': documents[i]['id'],
+        'target': documents[j]['id'],
+        'similarity': similarity,
+        'doc1': documents[i],
+        'doc2': documents[j]
+    } for (i, j), similarity in zip(pairs, similarities)]
+
+def update_graph(similarity_threshold=0.5, max_edges=15, max_neighbors=None,
+                 documents=None, embeddings=None, graph=None, progress=None):
+    """
+    Patch an existing graph after a corpus delta instead of rebuilding it.
+    The delta always comes from diff_graph() against the graph itself, so a
+    graph left behind by a failed run is caught up too.
+
+    - Only rows of added/changed documents are re-scored for similarity
+    - Classified edges whose endpoints are both unchanged are reused as-is
+    - Edges touching changed/removed documents are dropped
+    - Only newly selected edges are sent to Gemini
+
+    The result is the edge set a full build_graph() would select. Without
+    max_neighbors that is the global top max_edges of (reused edges + new
+    candidates), unless dropped edges freed slots that a pair of unchanged
+    documents below the old cut-off could take. With max_neighbors, any
+    document's nearest neighbours can change when others arrive or leave.
+    In both of those cases every row is re-scored (embeddings only: already
+    classified pairs are still reused, so Gemini sees just the new pairs).
+
+    graph.json is written whole (atomically), not edited in place, so API
+    readers never see a partial file.
+
+    Returns:
+        Updated graph (also saved to graph.json)
+    """
+    if documents is None:
+        documents = load_documents()
+    if graph is None:
+        try:
+            graph = load_graph()
+        except FileNotFoundError:
+            print("No existing graph.json, building from scratch...")
+            return build_graph(similarity_threshold, max_edges, max_neighbors, documents, embeddings, progress)
+    delta = diff_graph(graph, documents)
+
+    affected = set(delta.get('added', [])) | set(delta.get('changed', []))
+    dropped = affected | set(delta.get('removed', []))
+    print(f"Updating graph: {len(delta.get('added', []))} added, {len(delta.get('changed', []))} changed, "
+          f"{len(delta.get('removed', []))} removed")
+
+    docs_by_id = {doc['id']: doc for doc in documents}
+    row_by_id = {doc['id']: row for row, doc in enumerate(documents)}
+
+    # Classified edges between unchanged documents carry over
+    reused = [
+        edge for edge in graph['edges']
+        if edge['source'] not in dropped and edge['target'] not in dropped
+        and edge['source'] in docs_by_id and edge['target'] in docs_by_id
+    ]
+
+    # Re-score only the affected rows
+    candidates = []
+    affected_rows = [row_by_id[doc_id] for doc_id in affected if doc_id in row_by_id]
+    if affected_rows and not max_neighbors:
+        if embeddings is None:
+            embeddings = embeddings_for(documents)
+        pairs, similarities = find_edge_candidates(
+            embeddings,
+            similarity_threshold=similarity_threshold,
+            max_edges=max_edges,
+            rows=affected_rows
+        )
+        candidates = _candidate_edges(documents, pairs, similarities)
+
+    # Global top max_edges across reused edges and new candidates
+    merged = [(edge['similarity'], 0, idx) for idx, edge in enumerate(reused)]
+    merged += [(float(c['similarity']), 1, idx) for idx, c in enumerate(candidates)]
+    merged.sort(key=lambda item: -item[0])
+    if max_edges is not None:
+        merged = merged[:max_edges]
+
+    # Pairs of unchanged documents left out of a full old graph all score at
+    # most its weakest edge; if the new selection does not beat that, they
+    # may belong in it after all
+    old_edges = graph['edges']
+    was_full = max_edges is not None and len(old_edges) >= max_edges
+    if max_neighbors or (was_full and len(reused) < len(old_edges) and (
+            len(merged) < max_edges or merged[-1][0] < min(edge['similarity'] for edge in old_edges))):
+        print("Neighbourhoods of unchanged documents may have changed: re-scoring every row...")
+        if embeddings is None:
+            embeddings = embeddings_for(documents)
+        pairs, similarities = find_edge_candidates(
+            embeddings,
+            similarity_threshold=similarity_threshold,
+            max_edges=max_edges,
+            max_neighbors=max_neighbors
+        )
+        candidates = _candidate_edges(documents, pairs, similarities)
+        reused_by_pair = {frozenset((edge['source'], edge['target'])): idx for idx, edge in enumerate(reused)}
+        merged = []
+        for idx, candidate in enumerate(candidates):
+            reused_idx = reused_by_pair.get(frozenset((candidate['source'], candidate['target'])))
+            merged.append((float(candidate['similarity']), 1, idx) if reused_idx is None
+                          else (float(candidate['similarity']), 0, reused_idx))
+
+    to_classify = [candidates[idx] for _, origin, idx in merged if origin == 1]
+    classified = iter(classify_edges(to_classify, progress=progress))
+    edges = [reused[idx] if origin == 0 else next(classified) for _, origin, idx in merged]
+
+    # Patch nodes in document order; insights touching dropped documents are stale
+    graph['nodes'] = [make_node(doc) for doc in documents]
+    graph['edges'] = edges
+    graph['insights'] = [
+        insight for insight in graph.get('insights', [])
+        if not dropped.intersection(insight.get('nodes', []))
+    ]
+    graph.setdefault('metadata', {}).update({
+        "total_documents": len(documents),
+        "total_relationships": len(edges),
+        "similarity_threshold": similarity_threshold
+    })
+
+    save_graph(graph)
+    print(f"\n[SUCCESS] Graph updated: {len(edges) - len(to_classify)} edges reused, "
+          f"{len(to_classify)} newly classified")
+    print_graph_summary(graph)
+
     return graph
 
 if __name__ == "__main__":
-    # Run graph building
-    graph = build_graph(
+    # Run graph building (--incremental patches graph.json for changed documents only)
+    build = update_graph if "--incremental" in sys.argv else build_graph
+    graph = build(
         similarity_threshold=0.4,  # Lower = more connections
         max_edges=15  # Limit for hackathon speed/cost
     )
\ No newline at end of file
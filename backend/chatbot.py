@@ -3,44 +3,24 @@ Transmute - RAG Chatbot
 Semantic search + LLM for document Q&A
 """
 
-import json
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-import google.generativeai as genai
+from llm_executor import create_model, generate
 import os
 from dotenv import load_dotenv
 
-# Note: SentenceTransformer imported lazily in get_embedding_model()
+# Note: SentenceTransformer loaded lazily by embeddings.get_embedding_model()
+from embeddings import get_embedding_model
+from embedding_store import embeddings_for, DOCUMENT_EMBEDDINGS, PASSAGE_EMBEDDINGS
+from corpus_cache import corpus_cache
 
 load_dotenv()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
+# Configure Gemini (LLM_BACKEND=stub swaps in a local model)
 api_model = os.getenv("GEMINI_MODEL")
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(api_model)
-
-# Lazy-load embedding model (only when first needed)
-_embedding_model = None
-
-def get_embedding_model():
-    """Lazy-load the embedding model"""
-    global _embedding_model
-    if _embedding_model is None:
-        # Import here to avoid loading at module import time
-        from sentence_transformers import SentenceTransformer
-
-        print("Loading embedding model for chatbot...")
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("[OK] Chatbot ready")
-    return _embedding_model
-
-def load_documents():
-    """Load documents with embeddings"""
-    with open('documents.json', 'r') as f:
-        return json.load(f)
-
-def semantic_search(question, documents, top_k=3):
+model = create_model(api_model)
+
+def semantic_search(question, documents, top_k=3, doc_embeddings=None):
     """
     Find most relevant documents using cosine similarity
     """
@@ -51,7 +31,8 @@ def semantic_search(question, documents, top_k=3):
     question_embedding = embedding_model.encode(question)
 
     # Get document embeddings
-    doc_embeddings = np.array([doc['embedding'] for doc in documents])
+    if doc_embeddings is None:
+        doc_embeddings = embeddings_for(documents, DOCUMENT_EMBEDDINGS)
 
     # Calculate similarities
     similarities = cosine_similarity([question_embedding], doc_embeddings)[0]
@@ -68,6 +49,77 @@ def semantic_search(question, documents, top_k=3):
 
     return relevant_docs
 
+def search_passages(question, passages, documents, top_k=6, passage_embeddings=None, index=None, doc_index=None):
+    """
+    Find the most relevant passages using cosine similarity.
+    Uses the ingest-time vector index when given (top-k without a full scan).
+    doc_index: shared DocumentIndex for resolving passages to documents
+    """
+    embedding_model = get_embedding_model()
+    question_embedding = embedding_model.encode(question)
+
+    if passage_embeddings is None:
+        passage_embeddings = embeddings_for(passages, PASSAGE_EMBEDDINGS)
+
+    if index is not None:
+        top_indices, top_similarities = index.search(question_embedding, passage_embeddings, top_k)
+    else:
+        similarities = cosine_similarity([question_embedding], passage_embeddings)[0]
+        top_indices = np.argsort(similarities)[::-1][:top_k]
+        top_similarities = similarities[top_indices]
+
+    docs_by_id = doc_index or {doc['id']: doc for doc in documents}
+    relevant_passages = []
+    for idx, similarity in zip(top_indices, top_similarities):
+        passage = passages[idx]
+        doc = docs_by_id.get(passage['doc_id'])
+        if doc is None:
+            continue
+        relevant_passages.append({
+            'doc': doc,
+            'passage': passage,
+            'similarity': float(similarity)
+        })
+
+    return relevant_passages
+
+def group_passages_by_document(relevant_passages):
+    """
+    Group ranked passages by document, merging overlapping spans
+    so neighbouring chunks are not sent to the LLM twice
+    """
+    grouped = {}
+    for item in relevant_passages:
+        doc_id = item['doc']['id']
+        if doc_id not in grouped:
+            grouped[doc_id] = {'doc': item['doc'], 'spans': [], 'similarity': item['similarity']}
+        grouped[doc_id]['spans'].append((item['passage']['start'], item['passage']['end']))
+
+    for group in grouped.values():
+        merged = []
+        for start, end in sorted(group['spans']):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        content = group['doc']['content']
+        group['text'] = "\n...\n".join(content[start:end] for start, end in merged)
+
+    # Dicts keep insertion order, so documents stay in rank order
+    return list(grouped.values())
+
+def load_passage_index(passages):
+    """Cached vector index, or None if missing or built for a different passage set"""
+    try:
+        index = corpus_cache.vector_index()
+    except FileNotFoundError:
+        return None
+
+    # Both files are written together at ingest; a cheap check catches a stale index
+    if len(index.ids) != len(passages) or index.ids[-1:] != [p['id'] for p in passages[-1:]]:
+        return None
+    return index
+
 def answer_question(question, chat_history=None):
     """
     Answer question using RAG (Retrieval-Augmented Generation)
@@ -79,18 +131,37 @@ def answer_question(question, chat_history=None):
     Returns:
         {answer, sources}
     """
-    documents = load_documents()
+    # Parsed corpus and memory-mapped embeddings are shared across requests
+    documents = corpus_cache.documents()
 
-    # Find relevant documents
-    relevant = semantic_search(question, documents, top_k=3)
-
-    # Build context from relevant documents
+    # Find relevant passages (fall back to whole documents for older corpora)
+    try:
+        passages = corpus_cache.passages()
+    except FileNotFoundError:
+        passages = None
+
+    if passages:
+        passage_embeddings = corpus_cache.embeddings_for(passages, PASSAGE_EMBEDDINGS)
+        relevant = group_passages_by_document(search_passages(
+            question, passages, documents,
+            passage_embeddings=passage_embeddings,
+            index=load_passage_index(passages),
+            doc_index=corpus_cache.document_index()
+        ))
+    else:
+        doc_embeddings = corpus_cache.embeddings_for(documents, DOCUMENT_EMBEDDINGS)
+        relevant = [
+            {'doc': item['doc'], 'text': item['doc']['content'], 'similarity': item['similarity']}
+            for item in semantic_search(question, documents, top_k=3, doc_embeddings=doc_embeddings)
+        ]
+
+    # Build context from relevant passages
     context_parts = []
     sources = []
 
     for item in relevant:
         doc = item['doc']
-        context_parts.append(f"**{doc['title']}** ({doc['date']}):\n{doc['content']}\n")
+        context_parts.append(f"**{doc['title']}** ({doc['date']}):\n{item['text']}\n")
         sources.append({
             'doc_id': doc['id'],
             'title': doc['title'],
@@ -130,8 +201,8 @@ Please answer based on the context above."""
     full_prompt = f"{system_prompt}\n\n{user_message}"
 
     try:
-        response = model.generate_content(full_prompt)
-        answer = response.text.strip()
+        # Shares the pipeline's rate limit: the quota belongs to the API key
+        answer = generate(model, full_prompt).strip()
 
         return {
             'answer': answer,
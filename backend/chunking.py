@@ -0,0 +1,121 @@
+"""
+Transmute - Passage Chunking
+Splits documents into overlapping passages and embeds each one
+"""
+
+import json
+import os
+import re
+import numpy as np
+from embeddings import embed_texts
+from embedding_store import save_embeddings, save_json, DOCUMENT_EMBEDDINGS, PASSAGE_EMBEDDINGS
+from vector_index import build_vector_index
+
+PASSAGES_FILE = "passages.json"
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces; ~180 words stays under that
+CHUNK_WORDS = int(os.getenv("CHUNK_WORDS", "180"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "40"))
+
+def chunk_text(content, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping word windows.
+
+    Returns:
+        List of {start, end, text} where start/end are character offsets into content
+    """
+    spans = [match.span() for match in re.finditer(r'\S+', content)]
+    if not spans:
+        return []
+
+    step = max(chunk_words - overlap, 1)
+    chunks = []
+    for first_word in range(0, len(spans), step):
+        last_word = min(first_word + chunk_words, len(spans)) - 1
+        start = spans[first_word][0]
+        end = spans[last_word][1]
+        chunks.append({"start": start, "end": end, "text": content[start:end]})
+
+        if last_word == len(spans) - 1:
+            break
+
+    return chunks
+
+def build_passages(documents, batch_size=None, workers=None, progress=None):
+    """
+    Chunk and embed every document.
+
+    Each passage gets its own embedding; the document embedding (used for
+    graph similarity) is the normalized mean of its passage embeddings,
+    so the whole document is represented rather than its first 256 tokens.
+
+    progress: Optional callback(stage=..., **counters) for job status reporting
+
+    Returns:
+        passages: List of {id, doc_id, chunk_index, start, end}
+        passage_embeddings: Matrix with one row per passage
+        document_embeddings: Matrix with one row per document
+    """
+    passages = []
+    texts = []
+    for doc in documents:
+        for chunk_index, chunk in enumerate(chunk_text(doc['content'])):
+            passages.append({
+                "id": f"{doc['id']}#p{chunk_index}",
+                "doc_id": doc['id'],
+                "chunk_index": chunk_index,
+                "start": chunk['start'],
+                "end": chunk['end']
+            })
+            texts.append(chunk['text'])
+
+    print(f"  Split {len(documents)} documents into {len(passages)} passages")
+
+    on_progress = None
+    if progress:
+        # Passages are grouped per document, so a document is embedded once its last passage is
+        last_rows = {}
+        for row, passage in enumerate(passages):
+            last_rows[passage['doc_id']] = row
+        ends = np.sort(np.array(list(last_rows.values())) + 1)
+
+        def report_embedded(done):
+            progress(stage="embedding", files_total=len(documents),
+                     files_embedded=int(np.searchsorted(ends, done, side='right')),
+                     passages_total=len(passages), passages_embedded=done)
+        on_progress = report_embedded
+
+    passage_embeddings = embed_texts(texts, batch_size=batch_size, workers=workers, on_progress=on_progress)
+
+    # Group passage rows per document to derive document embeddings
+    rows_by_doc = {}
+    for row, passage in enumerate(passages):
+        rows_by_doc.setdefault(passage['doc_id'], []).append(row)
+
+    document_embeddings = np.zeros((len(documents), passage_embeddings.shape[1]), dtype='float32')
+    for idx, doc in enumerate(documents):
+        rows = rows_by_doc.get(doc['id'])
+        if not rows:
+            continue
+        mean = passage_embeddings[rows].mean(axis=0)
+        norm = np.linalg.norm(mean)
+        document_embeddings[idx] = mean / norm if norm > 0 else mean
+
+    return passages, passage_embeddings, document_embeddings
+
+def save_corpus_embeddings(documents, passages, passage_embeddings, document_embeddings):
+    """Save the passage index, both embedding stores and the passage vector index"""
+    passage_ids = [p['id'] for p in passages]
+    save_passages(passages)
+    save_embeddings(passage_ids, passage_embeddings, PASSAGE_EMBEDDINGS)
+    save_embeddings([doc['id'] for doc in documents], document_embeddings, DOCUMENT_EMBEDDINGS)
+    build_vector_index(passage_ids, passage_embeddings)
+
+def save_passages(passages, output_file=PASSAGES_FILE):
+    """Save the passage index"""
+    save_json(output_file, passages)
+
+def load_passages(input_file=PASSAGES_FILE):
+    """Load the passage index created at ingest time"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,228 @@
+"""
+Transmute - Columnar Artifacts
+Optional Parquet / Arrow IPC copies of documents, nodes, edges and insights,
+read with column projection and predicate pushdown (requires pyarrow)
+"""
+
+import json
+import os
+import sys
+from dotenv import load_dotenv
+from embedding_store import replace_file, save_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+load_dotenv()
+
+# "json" (default): JSON artifacts only; "parquet" or "arrow": the pipeline also
+# writes columnar tables and the API reads from them while they are current
+ARTIFACT_FORMAT = os.getenv("ARTIFACT_FORMAT", "json")
+COLUMNAR_DIR = os.getenv("COLUMNAR_DIR", "columnar")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "8192"))  # rows per group; min/max stats per group let filters skip
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+TABLES = ("documents", "nodes", "edges", "insights")
+MANIFEST_FILE = "manifest.json"
+
+# Not stored: embeddings live in the embedding store (embedding_store.py)
+DROPPED_FIELDS = {"embedding"}
+
+def columnar_available():
+    return pa is not None
+
+def columnar_enabled():
+    """True when ARTIFACT_FORMAT asks for columnar tables and pyarrow is installed"""
+    return ARTIFACT_FORMAT in FORMATS and columnar_available()
+
+def table_path(name, fmt=None, directory=None):
+    return os.path.join(directory or COLUMNAR_DIR, name + FORMATS[fmt or ARTIFACT_FORMAT])
+
+def manifest_path(directory=None):
+    return os.path.join(directory or COLUMNAR_DIR, MANIFEST_FILE)
+
+# Columns every table has even when empty, so filters on them always resolve
+KEY_COLUMNS = {
+    "documents": ("id", "title", "date"),
+    "nodes": ("id", "label", "date"),
+    "edges": ("source", "target", "type")
+}
+
+def _records_table(records, key_columns=()):
+    """Arrow table with one column per key seen in any record (missing values are null)"""
+    columns = dict.fromkeys(key_columns)
+    for record in records:
+        for key in record:
+            if key not in DROPPED_FIELDS:
+                columns.setdefault(key, None)
+    return pa.table({
+        key: pa.array([record.get(key) for record in records], type=pa.string() if key in key_columns else None)
+        for key in columns
+    })
+
+def _insights_table(insights):
+    # Insight shapes differ by type: type and nodes are real columns (filterable),
+    # everything else travels as a JSON payload
+    return pa.table({
+        "type": pa.array([insight['type'] for insight in insights], type=pa.string()),
+        "nodes": pa.array([insight.get('nodes', []) for insight in insights], type=pa.list_(pa.string())),
+        "payload": pa.array([
+            json.dumps({key: value for key, value in insight.items() if key not in ('type', 'nodes')})
+            for insight in insights
+        ], type=pa.string())
+    })
+
+def _write_table(table, path, fmt):
+    # Unique temp file swapped in (see replace_file), so readers never see half
+    # a file and concurrent writers never share a temp file
+    def write(sink):
+        if fmt == "parquet":
+            pq.write_table(table, sink, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        else:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    replace_file(path, write)
+
+def _source_entry(path, version):
+    stat = os.stat(path)
+    return {"version": version, "signature": [stat.st_mtime_ns, stat.st_size]}
+
+def write_columnar(graph, documents, sources, fmt=None, directory=None):
+    """
+    Write documents, nodes, edges and insights as columnar tables.
+
+    Args:
+        sources: {JSON artifact path: content version} the tables were built
+            from; the manifest records them so readers can tell when the JSON
+            has been rewritten since (and fall back to it)
+        fmt: "parquet" or "arrow" (Arrow IPC, memory-mapped on read)
+    """
+    fmt = fmt or ARTIFACT_FORMAT
+    directory = directory or COLUMNAR_DIR
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format '{fmt}' (expected one of: {', '.join(FORMATS)})")
+    if not columnar_available():
+        raise ImportError("pyarrow is required for columnar artifacts (pip install pyarrow)")
+    os.makedirs(directory, exist_ok=True)
+
+    tables = {
+        "documents": _records_table(documents, KEY_COLUMNS["documents"]),
+        "nodes": _records_table(graph['nodes'], KEY_COLUMNS["nodes"]),
+        "edges": _records_table(graph['edges'], KEY_COLUMNS["edges"]),
+        "insights": _insights_table(graph.get('insights', []))
+    }
+    for name, table in tables.items():
+        _write_table(table, table_path(name, fmt, directory), fmt)
+
+    # Graph keys other than nodes/edges/insights are small: kept in the manifest
+    manifest = {
+        "format": fmt,
+        "sources": {path: _source_entry(path, version) for path, version in sources.items()},
+        "graph_extra": {key: value for key, value in graph.items() if key not in ('nodes', 'edges', 'insights')},
+        "rows": {name: table.num_rows for name, table in tables.items()}
+    }
+    save_json(manifest_path(directory), manifest)
+    print(f"[SAVED] Columnar tables ({fmt}): {directory}/")
+    return manifest
+
+def load_manifest(directory=None):
+    with open(manifest_path(directory), 'r') as f:
+        return json.load(f)
+
+def is_current(manifest):
+    """True when every JSON artifact the tables came from is unchanged since (by mtime and size)"""
+    for path, entry in manifest['sources'].items():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if [stat.st_mtime_ns, stat.st_size] != entry['signature']:
+            return False
+    return True
+
+def open_dataset(name, fmt=None, directory=None):
+    """pyarrow dataset over one table; nothing is read until it is scanned"""
+    fmt = fmt or ARTIFACT_FORMAT
+    return ds.dataset(table_path(name, fmt, directory), format="parquet" if fmt == "parquet" else "ipc")
+
+def _filter_expression(filters):
+    # Same DNF tuples as pyarrow.parquet.read_table, e.g. [('date', '>=', '2024-04')]
+    return pq.filters_to_expression(filters) if filters else None
+
+def read_table(dataset, columns=None, filters=None):
+    """
+    Scan a dataset, reading only the given columns and rows matching filters.
+    Parquet row groups whose min/max statistics exclude the filter are skipped.
+    """
+    if columns is not None:
+        columns = [column for column in columns if column in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=_filter_expression(filters))
+
+def to_records(table):
+    """Arrow table back to JSON-style records (null values are left out)"""
+    records = [{key: value for key, value in row.items() if value is not None} for row in table.to_pylist()]
+    if "payload" in table.schema.names:
+        for record in records:
+            record.update(json.loads(record.pop("payload")))
+    return records
+
+def read_records(dataset, columns=None, filters=None, offset=0, limit=None):
+    """
+    One page of records from a dataset, plus the number of matching rows.
+    Only the page is converted to Python objects.
+    """
+    table = read_table(dataset, columns, filters)
+    page = table.slice(offset, limit) if limit is not None else table.slice(offset)
+    return to_records(page), table.num_rows
+
+def load_columnar(fmt=None, directory=None):
+    """(graph, documents) rebuilt from columnar tables"""
+    fmt = fmt or load_manifest(directory)['format']
+    read = lambda name: to_records(open_dataset(name, fmt, directory).to_table())
+    graph = {
+        "nodes": read("nodes"),
+        "edges": read("edges"),
+        **load_manifest(directory)['graph_extra'],
+        "insights": read("insights")
+    }
+    return graph, read("documents")
+
+def json_to_columnar(graph_file="graph.json", documents_file="documents.json", fmt=None, directory=None):
+    """Convert existing JSON artifacts to columnar tables"""
+    from summary import file_version
+
+    with open(graph_file, 'r') as f:
+        graph = json.load(f)
+    with open(documents_file, 'r') as f:
+        documents = json.load(f)
+    sources = {graph_file: file_version(graph_file), documents_file: file_version(documents_file)}
+    return write_columnar(graph, documents, sources, fmt=fmt, directory=directory)
+
+def columnar_to_json(graph_file="graph.json", documents_file="documents.json", directory=None):
+    """Write JSON artifacts back from columnar tables"""
+    graph, documents = load_columnar(directory=directory)
+    save_json(graph_file, graph)
+    save_json(documents_file, documents)
+    print(f"[SAVED] {graph_file}, {documents_file}")
+
+if __name__ == "__main__":
+    # python columnar.py export [parquet|arrow]  |  python columnar.py import
+    print("Transmute - Columnar Artifacts")
+    print("=" * 60)
+    if not columnar_available():
+        print("[ERROR] pyarrow is not installed (pip install pyarrow)")
+        sys.exit(1)
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if command == "export":
+        fmt = sys.argv[2] if len(sys.argv) > 2 else (ARTIFACT_FORMAT if ARTIFACT_FORMAT in FORMATS else "parquet")
+        json_to_columnar(fmt=fmt)
+    elif command == "import":
+        columnar_to_json()
+    else:
+        print(f"[ERROR] Unknown command '{command}' (expected export or import)")
+        sys.exit(1)
@@ -0,0 +1,228 @@
+"""
+Transmute - Corpus Cache
+Thread-safe in-process cache of pipeline artifacts for the API and chatbot
+"""
+
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from embedding_store import load_embeddings, DOCUMENT_EMBEDDINGS
+from chunking import PASSAGES_FILE
+from vector_index import load_vector_index, INDEX_FILE
+from summary import build_summary, SUMMARY_FILE
+from document_index import DocumentIndex
+from dedup import DUPLICATES_FILE
+import columnar
+from corpus_store import current_store
+
+GRAPH_FILE = "graph.json"
+DOCUMENTS_FILE = "documents.json"
+METRICS_FILE = "metrics.json"
+
+def _file_signature(paths):
+    """Cheap change check: (mtime, size) per file. Raises FileNotFoundError if missing."""
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+class CorpusCache:
+    """
+    Holds parsed artifacts in memory and reloads one only when its file changes.
+
+    JSON artifacts are re-parsed only if their content hash changed, so a
+    rewrite with identical bytes (or a bare touch) keeps the cached object.
+    Embedding stores are memory-mapped and versioned by mtime/size, since
+    hashing them would mean reading the whole matrix. A file that fails to
+    load (e.g. caught half written) leaves the previous value in place.
+
+    Cached objects are shared between requests: callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _get(self, key, paths, load, hash_content):
+        signature = _file_signature(paths)
+        entry = self._entries.get(key)
+        if entry and entry['signature'] == signature:
+            return entry['value']
+
+        # One loader per artifact; other artifacts stay readable meanwhile
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            signature = _file_signature(paths)
+            if entry and entry['signature'] == signature:
+                return entry['value']
+
+            if hash_content:
+                with open(paths[0], 'rb') as f:
+                    raw = f.read()
+                version = hashlib.sha256(raw).hexdigest()
+            else:
+                raw, version = None, "-".join(f"{mtime:x}.{size:x}" for mtime, size in signature)
+            if entry and entry['version'] == version:
+                value = entry['value']
+            else:
+                try:
+                    value = load(raw)
+                except ValueError as e:
+                    # Unreadable (e.g. written in place by an older tool): keep the last good copy
+                    if entry is None:
+                        raise
+                    print(f"[WARN] {paths[0]} could not be loaded ({e}); serving the previous version")
+                    return entry['value']
+
+            self._entries[key] = {'signature': signature, 'version': version, 'value': value}
+            return value
+
+    def _json(self, path):
+        return self._get(path, (path,), json.loads, hash_content=True)
+
+    def graph(self):
+        """Parsed graph.json"""
+        return self._json(GRAPH_FILE)
+
+    def documents(self):
+        """Parsed documents.json"""
+        return self._json(DOCUMENTS_FILE)
+
+    def metrics(self):
+        """Parsed metrics.json"""
+        return self._json(METRICS_FILE)
+
+    def duplicates(self):
+        """Parsed duplicates.json (dedup stage)"""
+        return self._json(DUPLICATES_FILE)
+
+    def summary(self):
+        """
+        Precomputed stats and insight indexes (summary.json).
+        A summary missing or older than graph.json/documents.json is rebuilt
+        in memory, once per artifact version.
+        """
+        sources = {GRAPH_FILE: self.artifact_version(GRAPH_FILE), DOCUMENTS_FILE: self.artifact_version(DOCUMENTS_FILE)}
+        try:
+            summary = self._json(SUMMARY_FILE)
+            if summary.get('sources') == sources:
+                return summary
+        except FileNotFoundError:
+            pass
+
+        version = f"{sources[GRAPH_FILE]}:{sources[DOCUMENTS_FILE]}"
+        return self._derived('summary:derived', version,
+                             lambda: build_summary(self.graph(), self.documents(), sources))
+
+    def document_index(self):
+        """DocumentIndex over documents.json, rebuilt only when the documents change"""
+        documents = self.documents()
+        return self._derived('document_index', self.version(DOCUMENTS_FILE), lambda: DocumentIndex(documents))
+
+    def _derived(self, key, version, build):
+        # Objects computed from loaded artifacts, cached per source version
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry and entry['version'] == version:
+                return entry['value']
+            value = build()
+            self._entries[key] = {'signature': None, 'version': version, 'value': value}
+            return value
+
+    def passages(self):
+        """Parsed passages.json"""
+        return self._json(PASSAGES_FILE)
+
+    def embedding_store(self, name=DOCUMENT_EMBEDDINGS):
+        """Memory-mapped EmbeddingStore for documents or passages"""
+        # Every save rewrites the ids file, which names the matrix generation
+        return self._get(name, (f"{name}.ids.json",), lambda raw: load_embeddings(name), hash_content=False)
+
+    def vector_index(self):
+        """Passage VectorIndex built at ingest time"""
+        return self._get(INDEX_FILE, (INDEX_FILE,), lambda raw: load_vector_index(), hash_content=False)
+
+    def embeddings_for(self, items, name=DOCUMENT_EMBEDDINGS):
+        """
+        Embedding matrix aligned with items (see embedding_store.embeddings_for).
+        Document embeddings come from the corpus store while it is current
+        with documents.json, read once per store version.
+        """
+        if items and 'embedding' in items[0]:
+            return np.array([item['embedding'] for item in items], dtype='float32')
+        if name == DOCUMENT_EMBEDDINGS:
+            store = current_store(DOCUMENTS_FILE)
+            if store is not None:
+                stored = self._derived('embeddings:store', json.dumps(store.sources(), sort_keys=True), store.embeddings)
+                if stored is not None:
+                    return stored.rows(item['id'] for item in items)
+        return self.embedding_store(name).rows(item['id'] for item in items)
+
+    def columnar_manifest(self):
+        """
+        Manifest of the columnar tables, or None when they should not be read:
+        ARTIFACT_FORMAT is json, pyarrow is missing, or a JSON artifact has
+        been rewritten since the tables were exported.
+        """
+        if not columnar.columnar_enabled():
+            return None
+        try:
+            manifest = self._json(columnar.manifest_path())
+        except FileNotFoundError:
+            return None
+        if manifest['format'] != columnar.ARTIFACT_FORMAT or not columnar.is_current(manifest):
+            return None
+        return manifest
+
+    def columnar(self, name):
+        """pyarrow dataset over a current columnar table (documents, nodes, edges, insights), or None"""
+        if self.columnar_manifest() is None:
+            return None
+        path = columnar.table_path(name)
+        return self._get(path, (path,), lambda raw: columnar.open_dataset(name), hash_content=False)
+
+    def corpus_store(self, *paths):
+        """Shared CorpusStore if it is current with the given JSON artifacts, else None"""
+        return current_store(*paths)
+
+    def artifact_version(self, path):
+        """
+        Content version of a JSON artifact. Taken from the columnar manifest
+        or the corpus store when they are current, so the JSON itself is never parsed.
+        """
+        manifest = self.columnar_manifest()
+        if manifest is not None and path in manifest['sources']:
+            return manifest['sources'][path]['version']
+        store = current_store(path)
+        if store is not None:
+            return store.sources()[path]['version']
+        return self.json_version(path)
+
+    def json_version(self, path):
+        """Content version of a JSON artifact, loading it first if needed"""
+        self._json(path)
+        return self.version(path)
+
+    def version(self, path):
+        """Content version of a loaded artifact (None until first load)"""
+        entry = self._entries.get(path)
+        return entry['version'] if entry else None
+
+    def invalidate(self, key=None):
+        """Drop one artifact (or all of them), e.g. when a pipeline run finishes"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+# Shared process-wide instance
+corpus_cache = CorpusCache()
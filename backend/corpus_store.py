@@ -0,0 +1,353 @@
+"""
+Transmute - Corpus Store
+SQLite copy of documents, embeddings, edges and insights with indexed queries
+(by id, date range, edge endpoint, insight type/node), so readers need no full load
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from embedding_store import EmbeddingStore
+
+load_dotenv()
+
+CORPUS_DB_FILE = os.getenv("CORPUS_DB_FILE", "corpus.sqlite3")
+CORPUS_DB_ENABLED = os.getenv("CORPUS_DB_ENABLED", "1") != "0"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY, position INTEGER, title TEXT, date TEXT, record TEXT
+);
+CREATE TABLE IF NOT EXISTS embeddings (id TEXT PRIMARY KEY, dim INTEGER, vector BLOB);
+CREATE TABLE IF NOT EXISTS edges (
+    position INTEGER PRIMARY KEY, source TEXT, target TEXT, type TEXT, record TEXT
+);
+CREATE TABLE IF NOT EXISTS insights (position INTEGER PRIMARY KEY, type TEXT, record TEXT);
+CREATE TABLE IF NOT EXISTS insight_nodes (insight INTEGER, node TEXT);
+CREATE INDEX IF NOT EXISTS idx_documents_position ON documents(position);
+CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(date, position);
+CREATE INDEX IF NOT EXISTS idx_documents_title ON documents(title);
+CREATE INDEX IF NOT EXISTS idx_edges_source ON edges(source);
+CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(target);
+CREATE INDEX IF NOT EXISTS idx_edges_type ON edges(type);
+CREATE INDEX IF NOT EXISTS idx_insights_type ON insights(type);
+CREATE INDEX IF NOT EXISTS idx_insight_nodes_node ON insight_nodes(node, insight);
+"""
+
+# Not stored in document records: vectors go to the embeddings table
+DROPPED_FIELDS = {"embedding"}
+
+class CorpusStore:
+    """
+    Indexed read/write access to the corpus in one SQLite file.
+
+    WAL journaling lets API readers keep querying the previous snapshot while
+    a pipeline run replaces the contents in a single transaction. Each thread
+    gets its own connection.
+
+    Also usable wherever a DocumentIndex is expected (get, [], in, len,
+    with_title, between, chronological), backed by the indexes instead of
+    an in-memory copy of the corpus.
+    """
+
+    def __init__(self, path=CORPUS_DB_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; WAL keeps the file consistent
+            self._local.conn = conn
+        return conn
+
+    # --- writing ---
+
+    def replace(self, graph, documents, sources, embeddings=None):
+        """
+        Replace the stored corpus in one transaction.
+
+        Args:
+            sources: {JSON artifact path: content version} the data came from,
+                so readers can tell when a JSON file has been rewritten since
+            embeddings: Optional matrix aligned with documents
+        """
+        conn = self.conn
+        with conn:
+            for table in ("documents", "embeddings", "edges", "insights", "insight_nodes", "meta"):
+                conn.execute(f"DELETE FROM {table}")
+
+            conn.executemany(
+                "INSERT INTO documents (id, position, title, date, record) VALUES (?, ?, ?, ?, ?)",
+                ((doc['id'], position, doc['title'], doc.get('date', 'unknown'),
+                  json.dumps({key: value for key, value in doc.items() if key not in DROPPED_FIELDS}))
+                 for position, doc in enumerate(documents))
+            )
+            if embeddings is not None:
+                vectors = np.asarray(embeddings, dtype='float32')
+                conn.executemany(
+                    "INSERT INTO embeddings (id, dim, vector) VALUES (?, ?, ?)",
+                    ((doc['id'], vectors.shape[1], vectors[i].tobytes()) for i, doc in enumerate(documents))
+                )
+            conn.executemany(
+                "INSERT INTO edges (position, source, target, type, record) VALUES (?, ?, ?, ?, ?)",
+                ((position, edge['source'], edge['target'], edge['type'], json.dumps(edge))
+                 for position, edge in enumerate(graph['edges']))
+            )
+            insights = graph.get('insights', [])
+            conn.executemany(
+                "INSERT INTO insights (position, type, record) VALUES (?, ?, ?)",
+                ((position, insight['type'], json.dumps(insight)) for position, insight in enumerate(insights))
+            )
+            conn.executemany(
+                "INSERT INTO insight_nodes (insight, node) VALUES (?, ?)",
+                ((position, node_id) for position, insight in enumerate(insights)
+                 for node_id in dict.fromkeys(insight.get('nodes', [])))
+            )
+
+            graph_extra = {key: value for key, value in graph.items() if key not in ('nodes', 'edges', 'insights')}
+            source_entries = {}
+            for path, version in sources.items():
+                stat = os.stat(path)
+                source_entries[path] = {"version": version, "signature": [stat.st_mtime_ns, stat.st_size]}
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("sources", json.dumps(source_entries)),
+                ("graph_extra", json.dumps(graph_extra))
+            ])
+
+        print(f"[SAVED] Corpus store: {self.path} ({len(documents)} documents, {len(graph['edges'])} edges)")
+
+    # --- freshness ---
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def sources(self):
+        """{JSON artifact path: {version, signature}} recorded by the last replace()"""
+        return self._meta("sources", {})
+
+    def is_current(self, *paths):
+        """True when the given JSON artifacts are unchanged since the store was written (by mtime and size)"""
+        sources = self.sources()
+        for path in paths:
+            entry = sources.get(path)
+            if entry is None:
+                return False
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return False
+            if [stat.st_mtime_ns, stat.st_size] != entry['signature']:
+                return False
+        return True
+
+    # --- documents (DocumentIndex interface) ---
+
+    def _documents(self, where="", params=(), order="position", limit=None, offset=0, fields=None, exclude=()):
+        """
+        Document records matching where, in order. fields / exclude project them
+        inside SQLite (JSON functions), so dropped fields never reach Python.
+        """
+        if fields is not None:
+            paths = [_json_path(field) for field in fields]
+            select = ", ".join("json_type(record, ?), json_extract(record, ?)" for _ in paths) or "NULL"
+            select_params = [path for path in paths for _ in range(2)]
+        elif exclude:
+            select = f"json_remove(record, {', '.join('?' * len(exclude))})"
+            select_params = [_json_path(field) for field in exclude]
+        else:
+            select, select_params = "record", []
+        sql = f"SELECT {select} FROM documents {where} ORDER BY {order}"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params = (*params, -1 if limit is None else limit, offset)
+        rows = self.conn.execute(sql, (*select_params, *params))
+        if fields is None:
+            return [json.loads(row[0]) for row in rows]
+        return [_extracted_record(fields, row) for row in rows]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def __contains__(self, doc_id):
+        return self.conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone() is not None
+
+    def __getitem__(self, doc_id):
+        doc = self.get(doc_id)
+        if doc is None:
+            raise KeyError(doc_id)
+        return doc
+
+    def get(self, doc_id, default=None):
+        """Document by id, or default"""
+        row = self.conn.execute("SELECT record FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def with_title(self, title):
+        """Documents with exactly this title"""
+        return self._documents("WHERE title = ?", (title,))
+
+    def _date_range(self, start, end):
+        clauses, params = ["date != 'unknown'"], []
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end + '\uffff')
+        return "WHERE " + " AND ".join(clauses), params
+
+    def between(self, start=None, end=None, offset=0, limit=None, fields=None, exclude=()):
+        """
+        Dated documents with start <= date <= end (prefix match on end), as DocumentIndex.between.
+        offset/limit page through them and fields/exclude project them in the query.
+        """
+        where, params = self._date_range(start, end)
+        return self._documents(where, params, order="date, position", limit=limit, offset=offset,
+                               fields=fields, exclude=exclude)
+
+    def count_between(self, start=None, end=None):
+        """Number of documents between() returns when unpaged"""
+        where, params = self._date_range(start, end)
+        return self.conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+
+    def chronological(self):
+        """All documents sorted by date ('unknown' sorts last)"""
+        return self._documents(order="date, position")
+
+    def previews(self, length=300):
+        """Title, date, word count and the first length characters of content per document, by date"""
+        rows = self.conn.execute(
+            "SELECT title, date, json_extract(record, '$.word_count'), substr(json_extract(record, '$.content'), 1, ?)"
+            " FROM documents ORDER BY date, position", (length,)
+        )
+        return [{"title": title, "date": date, "word_count": words, "preview": preview}
+                for title, date, words, preview in rows]
+
+    def totals(self):
+        """Document count, total words and the first and last date in chronological order"""
+        count, words = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(json_extract(record, '$.word_count')), 0) FROM documents"
+        ).fetchone()
+        first = self.conn.execute("SELECT date FROM documents ORDER BY date, position LIMIT 1").fetchone()
+        last = self.conn.execute("SELECT date FROM documents ORDER BY date DESC, position DESC LIMIT 1").fetchone()
+        return {"documents": count, "words": words,
+                "first_date": first[0] if first else None, "last_date": last[0] if last else None}
+
+    def documents(self, offset=0, limit=None):
+        """Documents in corpus order, optionally one page of them"""
+        return self._documents(limit=limit, offset=offset)
+
+    def embeddings(self):
+        """EmbeddingStore over the stored document vectors in corpus order, or None if none were stored"""
+        rows = self.conn.execute(
+            "SELECT id, dim, vector FROM embeddings JOIN documents USING (id) ORDER BY position"
+        ).fetchall()
+        if not rows:
+            return None
+        matrix = np.stack([np.frombuffer(blob, dtype='float32', count=dim) for _, dim, blob in rows])
+        return EmbeddingStore([doc_id for doc_id, _, _ in rows], matrix)
+
+    # --- graph ---
+
+    def edges(self, edge_type=None, touching=None):
+        """Edges in graph order, optionally of one type and/or with one endpoint equal to a document id"""
+        clauses, params = [], []
+        if edge_type is not None:
+            clauses.append("type = ?")
+            params.append(edge_type)
+        if touching is not None:
+            # Two index lookups (source, target) rather than a scan
+            clauses.append("position IN (SELECT position FROM edges WHERE source = ?"
+                           " UNION SELECT position FROM edges WHERE target = ?)")
+            params.extend([touching, touching])
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return [json.loads(row[0]) for row in
+                self.conn.execute(f"SELECT record FROM edges {where} ORDER BY position", params)]
+
+    def insights(self, insight_type=None, node_id=None):
+        """Insights in graph order, optionally of one type and/or mentioning one node"""
+        clauses, params = [], []
+        if insight_type is not None:
+            clauses.append("type = ?")
+            params.append(insight_type)
+        if node_id is not None:
+            clauses.append("position IN (SELECT insight FROM insight_nodes WHERE node = ?)")
+            params.append(node_id)
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return [json.loads(row[0]) for row in
+                self.conn.execute(f"SELECT record FROM insights {where} ORDER BY position", params)]
+
+    def graph_extra(self):
+        """Graph keys other than nodes, edges and insights (e.g. metadata)"""
+        return self._meta("graph_extra", {})
+
+def _json_path(field):
+    # Quoted, so a field name with dots addresses one top-level key; escaped
+    # quotes keep the path valid (such names just match nothing)
+    return '$."' + field.replace('"', '\\"') + '"'
+
+def _extracted_record(fields, row):
+    """Record from (json_type, json_extract) column pairs; fields absent from the document are left out"""
+    record = {}
+    for field, kind, value in zip(fields, row[::2], row[1::2]):
+        if kind is None:
+            continue
+        if kind in ('array', 'object'):
+            value = json.loads(value)
+        elif kind in ('true', 'false'):
+            value = kind == 'true'
+        record[field] = value
+    return record
+
+# Opened on first use so importing a stage never touches the disk
+_corpus_store = None
+_corpus_store_lock = threading.Lock()
+
+def get_corpus_store(create=False):
+    """Shared store, or None when CORPUS_DB_ENABLED=0 or (unless create) nothing has been written yet"""
+    global _corpus_store
+    if not CORPUS_DB_ENABLED or (not create and not os.path.exists(CORPUS_DB_FILE)):
+        return None
+    with _corpus_store_lock:
+        if _corpus_store is None:
+            _corpus_store = CorpusStore()
+    return _corpus_store
+
+def current_store(*paths):
+    """Shared store if it is up to date with the given JSON artifacts, else None (read from the JSON instead)"""
+    store = get_corpus_store()
+    return store if store is not None and store.is_current(*paths) else None
+
+if __name__ == "__main__":
+    from summary import file_version
+    from embedding_store import embeddings_for
+
+    print("Transmute - Corpus Store")
+    print("=" * 60)
+    with open('graph.json', 'r') as f:
+        graph = json.load(f)
+    with open('documents.json', 'r') as f:
+        documents = json.load(f)
+
+    try:
+        embeddings = embeddings_for(documents)
+    except (FileNotFoundError, KeyError) as e:
+        print(f"[WARN] No embeddings stored ({e})")
+        embeddings = None
+
+    sources = {"graph.json": file_version('graph.json'), "documents.json": file_version('documents.json')}
+    get_corpus_store(create=True).replace(graph, documents, sources, embeddings)
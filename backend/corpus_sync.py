@@ -0,0 +1,169 @@
+"""
+Transmute - Corpus Sync
+Stable document ids and incremental re-embedding of added/changed files
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from chunking import build_passages, load_passages
+from embedding_store import embeddings_for, DOCUMENT_EMBEDDINGS, PASSAGE_EMBEDDINGS
+
+DOCUMENTS_FILE = "documents.json"
+
+def content_hash(content):
+    """SHA-256 of a document's text"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def load_existing_documents(input_file=DOCUMENTS_FILE):
+    """Current corpus, or [] when nothing has been ingested yet"""
+    if not os.path.exists(input_file):
+        return []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _source_path(doc):
+    # Corpora ingested before stable ids only recorded the filename
+    return doc.get('source_path') or doc.get('filename')
+
+def _content_hash(doc):
+    return doc.get('content_hash') or content_hash(doc['content'])
+
+def assign_stable_ids(documents, existing):
+    """
+    Give every document a stable id and diff the set against the existing corpus.
+
+    A file keeps its id while its path stays the same (even if edited) or its
+    content stays the same (even if renamed). New files get an id derived from
+    their content hash, so ids never depend on enumeration order.
+
+    Each document must carry 'source_path'; 'content_hash' is filled in.
+
+    Returns:
+        {added, changed, removed, unchanged}: lists of document ids
+    """
+    by_path = {_source_path(doc): doc for doc in existing}
+    by_hash = {}
+    for doc in existing:
+        by_hash.setdefault(_content_hash(doc), []).append(doc)
+
+    delta = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    existing_ids = {doc['id'] for doc in existing}
+    claimed = set()
+    previous_of = {}
+
+    for doc in documents:
+        doc['content_hash'] = content_hash(doc['content'])
+
+    # Pass 1: same path keeps its id; pass 2: same content (renamed/moved) does
+    for doc in documents:
+        previous = by_path.get(doc['source_path'])
+        if previous is not None and previous['id'] not in claimed:
+            previous_of[id(doc)] = previous
+            claimed.add(previous['id'])
+    for doc in documents:
+        if id(doc) in previous_of:
+            continue
+        previous = next((d for d in by_hash.get(doc['content_hash'], []) if d['id'] not in claimed), None)
+        if previous is not None:
+            previous_of[id(doc)] = previous
+            claimed.add(previous['id'])
+
+    for doc in documents:
+        previous = previous_of.get(id(doc))
+        if previous is not None:
+            doc['id'] = previous['id']
+            status = "unchanged" if _content_hash(previous) == doc['content_hash'] else "changed"
+        else:
+            doc_id = f"doc_{doc['content_hash'][:12]}"
+            suffix = 1
+            # Identical copies of one file, or an id still held by a previous document
+            while doc_id in claimed or doc_id in existing_ids:
+                suffix += 1
+                doc_id = f"doc_{doc['content_hash'][:12]}_{suffix}"
+            doc['id'] = doc_id
+            claimed.add(doc_id)
+            status = "added"
+
+        delta[status].append(doc['id'])
+
+    delta["removed"] = [doc['id'] for doc in existing if doc['id'] not in claimed]
+    return delta
+
+def embed_documents(documents, existing=None, delta=None, batch_size=None, workers=None, progress=None):
+    """
+    Build passages and embeddings for documents.
+
+    With a delta (incremental mode), unchanged documents reuse their stored
+    passages and embeddings and only added/changed documents are embedded.
+    Without one, every document is embedded.
+
+    Returns:
+        (passages, passage_embeddings, document_embeddings) in document order
+    """
+    reuse_ids = set(delta['unchanged']) if delta else set()
+
+    old_passages, old_passage_matrix, old_doc_rows, old_doc_matrix = [], None, {}, None
+    old_rows_by_doc = {}
+    if reuse_ids:
+        try:
+            old_passages = load_passages()
+            old_passage_matrix = embeddings_for(old_passages, PASSAGE_EMBEDDINGS)
+            old_doc_matrix = embeddings_for(existing, DOCUMENT_EMBEDDINGS)
+            old_doc_rows = {doc['id']: row for row, doc in enumerate(existing)}
+        except (FileNotFoundError, KeyError) as e:
+            print(f"  Stored embeddings unavailable ({e}), embedding everything")
+            old_passages = []
+            reuse_ids = set()
+
+        # Passage rows per document in the old store; documents without any are re-embedded
+        for row, passage in enumerate(old_passages):
+            old_rows_by_doc.setdefault(passage['doc_id'], []).append(row)
+        reuse_ids &= set(old_rows_by_doc)
+
+    to_embed = [doc for doc in documents if doc['id'] not in reuse_ids]
+    print(f"  Embedding {len(to_embed)} of {len(documents)} documents ({len(reuse_ids)} reused)")
+    if to_embed or not reuse_ids:
+        new_passages, new_passage_matrix, new_doc_matrix = build_passages(
+            to_embed, batch_size=batch_size, workers=workers, progress=progress
+        )
+    else:
+        # Nothing added or changed: no chunking, and the embedding model is never loaded
+        new_passages, new_passage_matrix, new_doc_matrix = [], None, None
+    if not reuse_ids:
+        return new_passages, new_passage_matrix, new_doc_matrix
+
+    # Passage rows per document from this run
+    new_rows_by_doc = {}
+    for row, passage in enumerate(new_passages):
+        new_rows_by_doc.setdefault(passage['doc_id'], []).append(row)
+    new_doc_rows = {doc['id']: row for row, doc in enumerate(to_embed)}
+
+    passages, passage_blocks, doc_vectors = [], [], []
+    for doc in documents:
+        if doc['id'] in reuse_ids:
+            rows = old_rows_by_doc[doc['id']]
+            # Drop inline embeddings carried over from legacy passage files
+            passages.extend({k: v for k, v in old_passages[row].items() if k != 'embedding'} for row in rows)
+            passage_blocks.append(np.asarray(old_passage_matrix[rows], dtype='float32'))
+            doc_vectors.append(np.asarray(old_doc_matrix[old_doc_rows[doc['id']]], dtype='float32'))
+        else:
+            rows = new_rows_by_doc.get(doc['id'], [])
+            passages.extend(new_passages[row] for row in rows)
+            passage_blocks.append(new_passage_matrix[rows])
+            doc_vectors.append(new_doc_matrix[new_doc_rows[doc['id']]])
+
+    return passages, np.concatenate(passage_blocks), np.stack(doc_vectors)
+
+def summarize_delta(delta):
+    """Counts plus the ids that actually changed, for logs and API responses"""
+    return {
+        "added": len(delta['added']),
+        "changed": len(delta['changed']),
+        "removed": len(delta['removed']),
+        "unchanged": len(delta['unchanged']),
+        "added_ids": delta['added'],
+        "changed_ids": delta['changed'],
+        "removed_ids": delta['removed']
+    }
@@ -0,0 +1,231 @@
+"""
+Transmute - Deduplication
+Exact and near-duplicate documents: MinHash/LSH over text shingles, confirmed by
+shingle overlap or embedding similarity, and the bytes removing them would free
+"""
+
+import json
+import os
+import zlib
+import numpy as np
+from dotenv import load_dotenv
+from corpus_sync import content_hash
+from embedding_store import embeddings_for, save_json
+from graph_analytics import UnionFind
+from vector_index import VectorIndex
+
+load_dotenv()
+
+DUPLICATES_FILE = "duplicates.json"
+
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))        # words per shingle
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))              # MinHash signature length
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "32"))                     # LSH bands (NUM_PERM must divide evenly)
+DEDUP_JACCARD_THRESHOLD = float(os.getenv("DEDUP_JACCARD_THRESHOLD", "0.8"))
+DEDUP_EMBEDDING_THRESHOLD = float(os.getenv("DEDUP_EMBEDDING_THRESHOLD", "0.95"))
+DEDUP_MAX_BUCKET = int(os.getenv("DEDUP_MAX_BUCKET", "200"))          # larger LSH buckets are boilerplate, skipped
+DEDUP_EMBEDDING_NEIGHBORS = int(os.getenv("DEDUP_EMBEDDING_NEIGHBORS", "10"))  # nearest neighbours checked per document
+DEDUP_SHINGLE_BLOCK = int(os.getenv("DEDUP_SHINGLE_BLOCK", "1024"))   # shingles hashed at once (bounds memory)
+
+_PRIME = (1 << 31) - 1  # hash values and permutation coefficients stay below 2^31, so a*x+b fits in uint64
+
+def document_size(doc):
+    """Bytes a document takes up: its source file size when recorded at ingest, else its UTF-8 text"""
+    return doc.get('size_bytes') or len(doc['content'].encode('utf-8'))
+
+def shingle_hashes(text, size=DEDUP_SHINGLE_SIZE):
+    """31-bit hashes of the distinct word n-grams of a text (the whole text when shorter than one shingle)"""
+    words = text.lower().split()
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) & _PRIME for s in shingles),
+                       dtype=np.uint64, count=len(shingles))
+
+def minhash_signatures(documents, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE, seed=1):
+    """
+    MinHash signature matrix, one row per document.
+
+    Each of num_perm universal hashes (a*x + b) mod p is applied to a
+    document's shingles DEDUP_SHINGLE_BLOCK at a time, keeping a running
+    column-wise minimum, so long documents never need a shingles x num_perm
+    array. The fraction of equal positions in two rows estimates the Jaccard
+    similarity of the documents' shingle sets. Empty documents get all-max rows.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((len(documents), num_perm), _PRIME, dtype=np.uint64)
+    for i, doc in enumerate(documents):
+        hashes = shingle_hashes(doc['content'], shingle_size)
+        for start in range(0, len(hashes), DEDUP_SHINGLE_BLOCK):
+            block = hashes[start:start + DEDUP_SHINGLE_BLOCK, None]
+            np.minimum(signatures[i], ((block * a + b) % _PRIME).min(axis=0), out=signatures[i])
+    return signatures
+
+def lsh_candidates(signatures, bands=DEDUP_BANDS, max_bucket=DEDUP_MAX_BUCKET):
+    """
+    Candidate pairs (i, j), i < j, sharing at least one LSH band.
+
+    With r = num_perm / bands rows per band, a pair with Jaccard similarity s
+    becomes a candidate with probability 1 - (1 - s^r)^bands, an S-curve
+    rising around (1 / bands)^(1 / r): about 0.42 for the 32 x 4 default, so
+    pairs near the 0.8 threshold are all but certain to be compared while
+    unrelated documents almost never are. Buckets with more than max_bucket
+    members (shared boilerplate) are skipped to keep the pair count linear.
+    """
+    num_docs, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) must be divisible by DEDUP_BANDS ({bands})")
+    rows = num_perm // bands
+    empty = (signatures == _PRIME).all(axis=1)
+
+    candidates = set()
+    for band in range(bands):
+        keys = signatures[:, band * rows:(band + 1) * rows]
+        buckets = {}
+        for i in np.flatnonzero(~empty):
+            buckets.setdefault(keys[i].tobytes(), []).append(int(i))
+        for members in buckets.values():
+            if 1 < len(members) <= max_bucket:
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        candidates.add((members[x], members[y]))
+    return sorted(candidates)
+
+def embedding_candidates(vectors, threshold=DEDUP_EMBEDDING_THRESHOLD, neighbors=DEDUP_EMBEDDING_NEIGHBORS):
+    """
+    Candidate pairs (i, j), i < j, whose embeddings have cosine similarity >= threshold.
+
+    Reworded copies share too few shingles to meet in an LSH bucket, so each
+    document's nearest neighbours are looked up in a VectorIndex over the
+    document embeddings (exact for small corpora, IVF above
+    EXACT_SEARCH_LIMIT). Only the top neighbors per document are kept.
+    """
+    index = VectorIndex.build(range(len(vectors)), vectors)
+    candidates = set()
+    for i in range(len(vectors)):
+        rows, scores = index.search(vectors[i], vectors, top_k=neighbors + 1)  # +1: the document itself
+        for j, score in zip(rows.tolist(), scores.tolist()):
+            if j != i and score >= threshold:
+                candidates.add((min(i, j), max(i, j)))
+    return sorted(candidates)
+
+def find_duplicates(documents, embeddings=None, jaccard_threshold=DEDUP_JACCARD_THRESHOLD,
+                    embedding_threshold=DEDUP_EMBEDDING_THRESHOLD, progress=None):
+    """
+    Group exact and near-duplicate documents.
+
+    1. Exact: identical content hash (O(n))
+    2. Near: candidate pairs whose estimated shingle Jaccard similarity
+       >= jaccard_threshold, or whose embeddings have cosine similarity
+       >= embedding_threshold (reworded copies share fewer shingles but the
+       same meaning). Candidates come from MinHash/LSH on the shingles and
+       from each document's embedding nearest neighbours; only they are
+       scored, never all n^2 pairs.
+
+    Each group keeps its newest document (ties: largest, then first seen);
+    the others are removable and their real byte sizes are the savings.
+
+    Returns:
+        {
+          "groups": [{keep, duplicates, kind, bytes_removable}],
+          "pairs": [{doc1, doc2, kind, jaccard, similarity}],
+          "removable_docs", "removable_bytes", "total_bytes", "candidates_checked"
+        }
+    """
+    progress = progress or (lambda stage=None, **counters: None)
+    num_docs = len(documents)
+    sizes = [document_size(doc) for doc in documents]
+    pairs = []
+
+    # Exact duplicates
+    by_hash = {}
+    for i, doc in enumerate(documents):
+        by_hash.setdefault(doc.get('content_hash') or content_hash(doc['content']), []).append(i)
+    exact = set()
+    for members in by_hash.values():
+        for other in members[1:]:
+            exact.add((members[0], other))
+            pairs.append((members[0], other, "exact", 1.0, 1.0))
+
+    # Near duplicates: MinHash/LSH and embedding-neighbour prefilters, then verify each candidate
+    progress(stage="dedup", documents_total=num_docs)
+    signatures = minhash_signatures(documents)
+    vectors = np.asarray(embeddings if embeddings is not None else embeddings_for(documents), dtype='float32')
+    merged = sorted(set(lsh_candidates(signatures)) | set(embedding_candidates(vectors, embedding_threshold)))
+    candidates = [pair for pair in merged if pair not in exact
+                  and documents[pair[0]]['content'] != documents[pair[1]]['content']]
+
+    if candidates:
+        left = np.array([i for i, _ in candidates])
+        right = np.array([j for _, j in candidates])
+        jaccard = (signatures[left] == signatures[right]).mean(axis=1)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        similarity = (vectors[left] * vectors[right]).sum(axis=1)
+
+        near = (jaccard >= jaccard_threshold) | (similarity >= embedding_threshold)
+        for k in np.flatnonzero(near):
+            pairs.append((int(left[k]), int(right[k]), "near", float(jaccard[k]), float(similarity[k])))
+
+    # Duplicate groups: transitive closure of the pairs
+    sets = UnionFind(num_docs)
+    for i, j, *_ in pairs:
+        sets.union(i, j)
+    members_of, kinds = {}, {}
+    for i, j, kind, *_ in pairs:
+        root = sets.find(i)
+        kinds[root] = "near" if kind == "near" or kinds.get(root) == "near" else "exact"
+    for i in range(num_docs):
+        root = sets.find(i)
+        if root in kinds:
+            members_of.setdefault(root, []).append(i)
+
+    groups = []
+    for root, members in members_of.items():
+        keep = max(members, key=lambda i: (_date_key(documents[i]), sizes[i], -i))
+        removable = [i for i in members if i != keep]
+        groups.append({
+            "keep": documents[keep]['id'],
+            "duplicates": [documents[i]['id'] for i in removable],
+            "kind": kinds[root],
+            "bytes_removable": sum(sizes[i] for i in removable)
+        })
+    groups.sort(key=lambda group: -group['bytes_removable'])
+
+    result = {
+        "groups": groups,
+        "pairs": [
+            {"doc1": documents[i]['id'], "doc2": documents[j]['id'], "kind": kind,
+             "jaccard": round(jac, 3), "similarity": round(sim, 3)}
+            for i, j, kind, jac, sim in pairs
+        ],
+        "removable_docs": sum(len(group['duplicates']) for group in groups),
+        "removable_bytes": sum(group['bytes_removable'] for group in groups),
+        "total_bytes": sum(sizes),
+        "candidates_checked": len(candidates)
+    }
+    progress(documents_total=num_docs, duplicate_groups=len(groups))
+    print(f"[DEDUP] {len(groups)} duplicate groups, {result['removable_docs']} removable documents "
+          f"({result['removable_bytes'] / 1024:.2f} KB); {len(candidates)} candidates checked")
+    return result
+
+def _date_key(doc):
+    date = doc.get('date')
+    return date if date and date != 'unknown' else ""
+
+def save_duplicates(result, output_file=DUPLICATES_FILE):
+    save_json(output_file, result)
+    print(f"[SAVED] Duplicates: {output_file}")
+
+if __name__ == "__main__":
+    with open('documents.json', 'r') as f:
+        documents = json.load(f)
+
+    print("Transmute - Deduplication")
+    print("=" * 60)
+    save_duplicates(find_duplicates(documents))
@@ -0,0 +1,72 @@
+"""
+Transmute - Document Index
+In-memory lookups over the corpus (by id, title and date), built once and shared
+"""
+
+from bisect import bisect_left, bisect_right
+
+class DocumentIndex:
+    """
+    Read-only index over a documents list.
+
+    - get(doc_id) / index[doc_id]: O(1) record lookup
+    - with_title(title): documents with that exact title
+    - between(start, end): documents dated in [start, end] (ISO date prefixes,
+      so '2024-03' matches '2024-03-15'); undated ('unknown') documents are skipped
+    - chronological(): documents sorted by date
+    - previews(length) / totals(): what the wiki needs, without the full records
+
+    The records are the documents themselves, not copies: callers must not mutate them.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.by_id = {}
+        self.by_title = {}
+        for doc in documents:
+            self.by_id[doc['id']] = doc
+            self.by_title.setdefault(doc['title'], []).append(doc)
+
+        self._chronological = sorted(documents, key=lambda d: d.get('date', 'unknown'))
+        dated = [doc for doc in self._chronological if doc.get('date', 'unknown') != 'unknown']
+        self._dated = dated
+        self._dates = [doc['date'] for doc in dated]
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.by_id
+
+    def __getitem__(self, doc_id):
+        return self.by_id[doc_id]
+
+    def get(self, doc_id, default=None):
+        """Document by id, or default"""
+        return self.by_id.get(doc_id, default)
+
+    def with_title(self, title):
+        """Documents with exactly this title"""
+        return self.by_title.get(title, [])
+
+    def between(self, start=None, end=None):
+        """Dated documents with start <= date <= end (prefix match on end)"""
+        lo = bisect_left(self._dates, start) if start else 0
+        # '\uffff' sorts after every date suffix, so '2024-03' includes all of March
+        hi = bisect_right(self._dates, end + '\uffff') if end else len(self._dates)
+        return self._dated[lo:hi]
+
+    def chronological(self):
+        """All documents sorted by date ('unknown' sorts last)"""
+        return self._chronological
+
+    def previews(self, length=300):
+        """Title, date, word count and the first length characters of content per document, by date"""
+        return [{"title": doc['title'], "date": doc['date'], "word_count": doc['word_count'],
+                 "preview": doc['content'][:length]} for doc in self._chronological]
+
+    def totals(self):
+        """Document count, total words and the first and last date in chronological order"""
+        docs = self._chronological
+        return {"documents": len(docs), "words": sum(doc['word_count'] for doc in docs),
+                "first_date": docs[0]['date'] if docs else None, "last_date": docs[-1]['date'] if docs else None}
@@ -0,0 +1,169 @@
+"""
+Transmute - Embedding Store
+Compact binary embedding matrices (.npy) keyed by document/passage id
+"""
+
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DOCUMENT_EMBEDDINGS = "embeddings"
+PASSAGE_EMBEDDINGS = "passage_embeddings"
+
+# float16 halves the store again at a negligible cost in similarity precision
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+class EmbeddingStore:
+    """Embedding matrix plus an id -> row lookup"""
+
+    def __init__(self, ids, matrix):
+        self.ids = list(ids)
+        self.matrix = matrix
+        self.row_by_id = {item_id: row for row, item_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.row_by_id
+
+    def get(self, item_id):
+        """Return the embedding for one id (a view into the matrix)"""
+        return self.matrix[self.row_by_id[item_id]]
+
+    def rows(self, ids):
+        """
+        Return embeddings for ids in the given order.
+        Returns the stored matrix itself (no copy) when the order already matches.
+        """
+        ids = list(ids)
+        if ids == self.ids:
+            return self.matrix
+
+        missing = [item_id for item_id in ids if item_id not in self.row_by_id]
+        if missing:
+            raise KeyError(f"No embeddings stored for: {', '.join(missing[:5])}")
+        return self.matrix[[self.row_by_id[item_id] for item_id in ids]]
+
+def _ids_path(name):
+    return f"{name}.ids.json"
+
+def _read_ids(name):
+    """Read a store's ids file: (ids, matrix generation file)"""
+    with open(_ids_path(name), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['ids'], data['matrix']
+
+def replace_file(path, write, mode='wb'):
+    """
+    Write a file next to its target and swap it in with os.replace.
+    Readers holding the old file (e.g. a memory map) keep the old inode and
+    never see it truncated or half written.
+    """
+    # Unique per writer, so two jobs saving the same artifact never share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_json(path, data):
+    """Write a JSON artifact atomically (see replace_file)"""
+    replace_file(path, lambda f: json.dump(data, f, indent=2), mode='w')
+
+def save_embeddings(ids, matrix, name=DOCUMENT_EMBEDDINGS, dtype=None):
+    """
+    Save an embedding matrix and its row ids.
+    Each save writes a new matrix generation ({name}.<gen>.npy); swapping in
+    the ids file that names it is the single commit point, so a reader always
+    pairs ids with their own rows.
+    """
+    ids = list(ids)
+    matrix = np.ascontiguousarray(matrix, dtype=dtype or EMBEDDING_DTYPE)
+    if matrix.shape[0] != len(ids):
+        raise ValueError(f"{len(ids)} ids for {matrix.shape[0]} embedding rows")
+
+    ids_file = _ids_path(name)
+    matrix_file = f"{name}.{uuid.uuid4().hex[:12]}.npy"
+    try:
+        _, previous_file = _read_ids(name)
+    except (FileNotFoundError, ValueError):
+        previous_file = None
+
+    replace_file(matrix_file, lambda f: np.save(f, matrix))
+    replace_file(ids_file, lambda f: json.dump({'matrix': matrix_file, 'ids': ids}, f), mode='w')
+
+    # Readers that already mapped the old generation keep its inode
+    if previous_file and previous_file != matrix_file:
+        try:
+            os.remove(previous_file)
+        except FileNotFoundError:
+            pass
+
+    return matrix_file
+
+def load_embeddings(name=DOCUMENT_EMBEDDINGS, mmap=True):
+    """
+    Open an embedding store.
+    With mmap=True the matrix is memory-mapped read-only instead of copied into RAM.
+    Raises ValueError if the matrix row count does not match the ids.
+    """
+    for attempt in range(3):
+        ids, matrix_file = _read_ids(name)
+        try:
+            matrix = np.load(matrix_file, mmap_mode='r' if mmap else None)
+            break
+        except FileNotFoundError:
+            # A newer save removed this generation between the two reads
+            if attempt == 2:
+                raise
+
+    if matrix.shape[0] != len(ids):
+        raise ValueError(f"{matrix_file} has {matrix.shape[0]} rows for {len(ids)} ids")
+    return EmbeddingStore(ids, matrix)
+
+def embeddings_for(items, name=DOCUMENT_EMBEDDINGS, store=None):
+    """
+    Embedding matrix aligned with a list of documents or passages.
+    Legacy files that still carry inline 'embedding' lists are used as-is.
+    """
+    if items and 'embedding' in items[0]:
+        return np.array([item['embedding'] for item in items], dtype='float32')
+
+    store = store or load_embeddings(name)
+    return store.rows(item['id'] for item in items)
+
+def migrate_inline_embeddings(json_file, name):
+    """Move inline 'embedding' lists out of a JSON artifact into a binary store"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+
+    if not items or 'embedding' not in items[0]:
+        print(f"  {json_file}: no inline embeddings, skipping")
+        return
+
+    matrix = np.array([item.pop('embedding') for item in items], dtype='float32')
+    matrix_file = save_embeddings([item['id'] for item in items], matrix, name)
+
+    save_json(json_file, items)
+
+    print(f"  {json_file}: moved {len(items)} embeddings to {matrix_file}")
+
+if __name__ == "__main__":
+    print("Transmute - Embedding Store Migration")
+    print("=" * 60)
+
+    migrate_inline_embeddings("documents.json", DOCUMENT_EMBEDDINGS)
+    if os.path.exists("passages.json"):
+        migrate_inline_embeddings("passages.json", PASSAGE_EMBEDDINGS)
+
+    print("[COMPLETE] documents.json now holds metadata only")
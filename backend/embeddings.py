@@ -0,0 +1,80 @@
+"""
+Transmute - Embedding Stage
+Batched embedding generation shared by ingest.py and upload_processor.py
+"""
+
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Tuning (override in .env for large ingestion boxes)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+
+# Lazy-load embedding model
+_embedding_model = None
+
+def get_embedding_model():
+    """Lazy-load the embedding model (shared by every pipeline stage)"""
+    global _embedding_model
+    if _embedding_model is None:
+        # Import here to avoid loading torch at module import time
+        from sentence_transformers import SentenceTransformer
+
+        print("Loading embedding model...")
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        print("[OK] Model loaded")
+    return _embedding_model
+
+def embed_texts(texts, batch_size=None, workers=None, on_progress=None):
+    """
+    Encode a list of texts in batches.
+
+    Args:
+        texts: List of strings to embed
+        batch_size: Texts per forward pass (default: EMBEDDING_BATCH_SIZE)
+        workers: CPU worker processes; 1 encodes in-process (default: EMBEDDING_WORKERS)
+        on_progress: Optional callback(texts_done) after each group of batches
+
+    Returns:
+        float32 numpy array of shape (len(texts), dimensions)
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    workers = workers or EMBEDDING_WORKERS
+    model = get_embedding_model()
+
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype='float32')
+
+    print(f"  Embedding {len(texts)} texts (batch size {batch_size}, workers {workers})...")
+
+    # Spreading batches over processes only pays off once every worker gets a few batches
+    if workers > 1 and len(texts) > batch_size * workers:
+        pool = model.start_multi_process_pool(target_devices=['cpu'] * workers)
+        try:
+            embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        # Encode a few batches at a time so progress can be reported between groups
+        group_size = batch_size * 8 if on_progress else len(texts)
+        groups = []
+        for start in range(0, len(texts), group_size):
+            groups.append(model.encode(
+                texts[start:start + group_size],
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            ))
+            if on_progress:
+                on_progress(min(start + group_size, len(texts)))
+        embeddings = np.concatenate(groups)
+
+    if on_progress:
+        on_progress(len(texts))
+
+    return embeddings.astype('float32', copy=False)
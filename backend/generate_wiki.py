@@ -6,15 +6,20 @@ Creates Wikipedia-style summary from knowledge graph
 import json
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+from llm_executor import create_model, generate
+from llm_cache import cache_get, cache_put, cache_key, content_hash
+from document_index import DocumentIndex
+from corpus_store import current_store
+from embedding_store import replace_file
 
 load_dotenv()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
+# Configure Gemini (LLM_BACKEND=stub swaps in a local model)
 api_model = os.getenv("GEMINI_MODEL")
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(api_model)
+model = create_model(api_model)
+
+# Bump when the wiki prompt changes so cached articles are not reused
+WIKI_PROMPT_VERSION = "wiki-v1"
 
 def load_graph():
     """Load the enhanced graph.json"""
@@ -26,19 +31,20 @@ def load_documents():
     with open('documents.json', 'r') as f:
         return json.load(f)
 
-def generate_wiki_summary(graph, documents):
+def generate_wiki_summary(graph, documents=None, doc_index=None):
     """
     Generate Wikipedia-style markdown summary using AI
+    doc_index: DocumentIndex over documents (e.g. corpus_cache.document_index())
+    or a CorpusStore; built from documents if not passed
     """
+    if doc_index is None:
+        doc_index = DocumentIndex(documents)
 
-    # Sort documents by date for chronological context
-    sorted_docs = sorted(documents, key=lambda d: d.get('date', 'unknown'))
-
-    # Prepare detailed document summaries
+    # Documents by date for chronological context
+    # (the first 300 chars of each rather than the full records)
     doc_summaries = []
-    for doc in sorted_docs:
-        # Get first 300 chars for better context
-        preview = doc['content'][:300].replace('\n', ' ')
+    for doc in doc_index.previews(300):
+        preview = doc['preview'].replace('\n', ' ')
         doc_summaries.append(
             f"- **{doc['title']}** ({doc['date']}) - {doc['word_count']} words\n  {preview}..."
         )
@@ -58,8 +64,8 @@ def generate_wiki_summary(graph, documents):
         rel_context.append(f"\n**{rel_type.upper()}** ({len(rels)} relationships):")
         for rel in rels[:5]:  # Show first 5 of each type
             # NOTE: Graph uses 'source' and 'target', not 'from' and 'to'
-            from_doc = next((d for d in documents if d['id'] == rel['source']), None)
-            to_doc = next((d for d in documents if d['id'] == rel['target']), None)
+            from_doc = doc_index.get(rel['source'])
+            to_doc = doc_index.get(rel['target'])
             if from_doc and to_doc:
                 rel_context.append(
                     f"  • {from_doc['title']} → {to_doc['title']} (similarity: {rel.get('similarity', 0):.2f})"
@@ -96,14 +102,15 @@ def generate_wiki_summary(graph, documents):
             )
 
     # Calculate statistics
-    total_words = sum(doc['word_count'] for doc in documents)
-    date_range = f"{sorted_docs[0]['date']} to {sorted_docs[-1]['date']}" if len(sorted_docs) > 1 else sorted_docs[0]['date']
+    totals = doc_index.totals()
+    total_words = totals['words']
+    date_range = f"{totals['first_date']} to {totals['last_date']}" if totals['documents'] > 1 else totals['first_date']
 
     # Build enhanced prompt
     prompt = f"""You are writing a comprehensive Wikipedia-style article that synthesizes a project's documentation into a cohesive knowledge base.
 
 📊 **DATASET OVERVIEW**
-- Total Documents: {len(documents)}
+- Total Documents: {totals['documents']}
 - Total Words: {total_words:,}
 - Date Range: {date_range}
 - Relationship Types: {len(rel_by_type)}
@@ -127,7 +134,7 @@ Create a Wikipedia-style article with the following structure:
 
 # [Extract Project Name from Documents]
 
-> *A comprehensive knowledge synthesis from {len(documents)} documents spanning {date_range}*
+> *A comprehensive knowledge synthesis from {totals['documents']} documents spanning {date_range}*
 
 ## Overview
 Write a 2-3 paragraph introduction that:
@@ -177,7 +184,7 @@ Create a structured list of all documents organized by theme or category:
 - Show relationships between documents when relevant
 
 ## Statistics
-- Total documents analyzed: {len(documents)}
+- Total documents analyzed: {totals['documents']}
 - Total content: {total_words:,} words
 - Relationships mapped: {len(edges)}
 - Contradictions identified: {len(contradictions)}
@@ -197,9 +204,15 @@ Create a structured list of all documents organized by theme or category:
 
 **CRITICAL:** Synthesize information across documents to tell a coherent story. Don't just summarize each document separately - show how they relate, contradict, or build upon each other."""
 
+    # The prompt embeds every document, relationship and insight it depends on
+    key = cache_key(api_model, WIKI_PROMPT_VERSION, content_hash(prompt))
+    cached = cache_get(key)
+    if cached:
+        return cached
+
     try:
-        response = model.generate_content(prompt)
-        wiki_content = response.text.strip()
+        # Rate-limited, retried call shared with every other pipeline stage
+        wiki_content = generate(model, prompt).strip()
 
         # Clean markdown if wrapped in code blocks
         if wiki_content.startswith('```'):
@@ -207,6 +220,7 @@ Create a structured list of all documents organized by theme or category:
             if wiki_content.startswith('markdown'):
                 wiki_content = wiki_content[8:].strip()
 
+        cache_put(key, "wiki", wiki_content)
         return wiki_content
 
     except Exception as e:
@@ -215,8 +229,7 @@ Create a structured list of all documents organized by theme or category:
 
 def save_wiki(content):
     """Save wiki content to file"""
-    with open('wiki.md', 'w', encoding='utf-8') as f:
-        f.write(content)
+    replace_file('wiki.md', lambda f: f.write(content), mode='w')
 
 if __name__ == "__main__":
     print("Transmute - Wiki Generator")
@@ -224,10 +237,12 @@ if __name__ == "__main__":
 
     print("\nLoading data...")
     graph = load_graph()
-    documents = load_documents()
+    # Indexed document reads from the corpus store when it is current
+    store = current_store('documents.json')
+    documents = load_documents() if store is None else None
 
     print("Generating wiki summary with AI...")
-    wiki = generate_wiki_summary(graph, documents)
+    wiki = generate_wiki_summary(graph, documents, doc_index=store)
 
     save_wiki(wiki)
 
@@ -0,0 +1,331 @@
+"""
+Transmute - Graph Analytics
+Sparse adjacency over the knowledge graph: components, communities and centrality
+"""
+
+import os
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "components": connected components; "communities": label propagation,
+# which splits the giant component of a dense graph into topical groups
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "components")
+
+# Edge weight = similarity x type weight
+EDGE_TYPE_WEIGHTS = {
+    "updates": 1.5,
+    "supports": 1.2,
+    "relates_to": 1.0,
+    "contradicts": 1.0
+}
+
+# Centrality weights: contradictions and updates count double, as in impact scores
+IMPACT_EDGE_WEIGHTS = {
+    "contradicts": 2.0,
+    "updates": 2.0,
+    "supports": 1.0,
+    "relates_to": 1.0
+}
+
+PAGERANK_DAMPING = 0.85
+BETWEENNESS_SAMPLES = int(os.getenv("BETWEENNESS_SAMPLES", "64"))  # BFS sources; exact when >= node count
+
+def build_adjacency(graph, type_weights=None):
+    """
+    Symmetric CSR adjacency matrix of the graph.
+
+    Weights are edge similarity times the type weight; parallel edges add up.
+    Edges pointing at unknown nodes are ignored.
+
+    Returns:
+        (node_ids, adjacency): row i of adjacency is node_ids[i]
+    """
+    type_weights = type_weights or EDGE_TYPE_WEIGHTS
+    node_ids = [node['id'] for node in graph['nodes']]
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    rows, cols, weights = [], [], []
+    for edge in graph['edges']:
+        i, j = position.get(edge['source']), position.get(edge['target'])
+        if i is None or j is None or i == j:
+            continue
+        rows.append(i)
+        cols.append(j)
+        weights.append(float(edge.get('similarity', 1.0)) * type_weights.get(edge.get('type'), 1.0))
+
+    n = len(node_ids)
+    rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+    weights = np.array(weights, dtype=np.float64)
+    adjacency = sparse.coo_matrix(
+        (np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n, n)
+    ).tocsr()
+    adjacency.sum_duplicates()
+    return node_ids, adjacency
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with union by size and path halving (no recursion)"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+def connected_components(graph):
+    """Connected components as lists of node ids, in graph['nodes'] order"""
+    node_ids = [node['id'] for node in graph['nodes']]
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    sets = UnionFind(len(node_ids))
+    for edge in graph['edges']:
+        i, j = position.get(edge['source']), position.get(edge['target'])
+        if i is not None and j is not None:
+            sets.union(i, j)
+
+    labels = [sets.find(i) for i in range(len(node_ids))]
+    return _groups(node_ids, labels)
+
+def label_propagation(adjacency, max_iter=30, seed=0):
+    """
+    Weighted label propagation on a sparse adjacency matrix.
+
+    Every node starts in its own community and repeatedly adopts the label
+    with the largest total edge weight among its neighbours (ties keep the
+    current label). Each round is a handful of vectorized passes over the
+    edge list, and a random half of the nodes update per round so labels
+    cannot oscillate between two states.
+
+    Returns:
+        Array of community labels, one per row
+    """
+    n = adjacency.shape[0]
+    labels = np.arange(n, dtype=np.int64)
+    coo = adjacency.tocoo()
+    rows, cols, weights = coo.row.astype(np.int64), coo.col.astype(np.int64), coo.data
+    if not len(rows):
+        return labels
+
+    rng = np.random.default_rng(seed)
+    for _ in range(max_iter):
+        # Total weight per (node, neighbour label)
+        keys = rows * n + labels[cols]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        nodes, candidates = unique_keys // n, unique_keys % n
+        totals = totals + 1e-9 * (candidates == labels[nodes])  # prefer staying put on ties
+
+        # Best label per node: sort by node, then weight descending, keep the first
+        order = np.lexsort((-totals, nodes))
+        nodes, candidates = nodes[order], candidates[order]
+        first = np.ones(len(nodes), dtype=bool)
+        first[1:] = nodes[1:] != nodes[:-1]
+        nodes, best = nodes[first], candidates[first]
+
+        changed = best != labels[nodes]
+        if not changed.any():
+            break
+        update = changed & (rng.random(len(nodes)) < 0.5)
+        labels[nodes[update]] = best[update]
+
+    return labels
+
+def detect_communities(graph, type_weights=None, max_iter=30):
+    """Label propagation communities as lists of node ids, in graph['nodes'] order"""
+    node_ids, adjacency = build_adjacency(graph, type_weights)
+    return _groups(node_ids, label_propagation(adjacency, max_iter=max_iter).tolist())
+
+def _groups(node_ids, labels):
+    groups = {}
+    for node_id, label in zip(node_ids, labels):
+        groups.setdefault(label, []).append(node_id)
+    return list(groups.values())
+
+def pagerank(adjacency, damping=PAGERANK_DAMPING, tol=1e-10, max_iter=100):
+    """
+    Weighted PageRank by power iteration on the sparse matrix.
+    Rank of nodes without edges is spread evenly, so scores sum to 1.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0)
+
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition = sparse.diags(inverse) @ adjacency  # row-stochastic except dangling rows
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        updated = damping * (transition.T @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(updated - rank).sum() < tol:
+            return updated
+        rank = updated
+    return rank
+
+def _bfs_depths(adjacency, source):
+    """
+    Hop distance of every node from source (-1 when unreachable), from the
+    csgraph BFS tree: depths are summed up the predecessor links by pointer
+    jumping, so deep trees take O(log depth) array passes.
+    """
+    n = adjacency.shape[0]
+    # The adjacency is symmetric already, so the cheaper directed BFS suffices
+    order, predecessors = csgraph.breadth_first_order(adjacency, source, directed=True, return_predecessors=True)
+    ancestor = np.arange(n)
+    ancestor[order[1:]] = predecessors[order[1:]]
+    depth = (ancestor != np.arange(n)).astype(np.int64)
+    while True:
+        jumped = ancestor[ancestor]
+        if np.array_equal(jumped, ancestor):
+            break
+        depth, ancestor = depth + depth[ancestor], jumped
+
+    distance = np.full(n, -1, dtype=np.int32)
+    distance[order] = depth[order]
+    return distance
+
+def approximate_betweenness(adjacency, samples=BETWEENNESS_SAMPLES, seed=0, block_elements=4_000_000):
+    """
+    Betweenness centrality (hop-count shortest paths) by Brandes' algorithm
+    from a random sample of source nodes, scaled up to the full node count.
+
+    Sources are handled in batches of at most block_elements (source, edge)
+    pairs: a csgraph BFS gives each source's distances, then path counts and
+    dependencies of the whole batch are pushed along shortest-path edges one
+    level at a time. The level loop runs once per batch rather than once per
+    source, so deep graphs (long supersession chains) stay cheap.
+    Exact when samples >= node count.
+    Normalized to [0, 1] like networkx's normalized betweenness.
+    """
+    n = adjacency.shape[0]
+    if n < 3:
+        return np.zeros(n)
+
+    links = adjacency.tocoo()
+    tails, heads = links.row.astype(np.int64), links.col.astype(np.int64)
+    if samples >= n:
+        sources = np.arange(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, size=samples, replace=False)
+
+    centrality = np.zeros(n)
+    batch_size = max(1, block_elements // max(len(tails), 1))
+    for first in range(0, len(sources), batch_size):
+        batch = sources[first:first + batch_size]
+        roots = np.arange(len(batch)) * n + batch  # source positions in the flattened batch
+        # node x source, so each edge gathers contiguous rows
+        distance = np.stack([_bfs_depths(adjacency, source) for source in batch], axis=1)
+
+        # Edges one hop further from their source, grouped by the tail's depth
+        tail_depth = distance[tails]
+        on_path = (tail_depth >= 0) & (distance[heads] == tail_depth + 1)
+        flat = np.flatnonzero(on_path)
+        if not len(flat):
+            continue
+        edge, which = np.divmod(flat, len(batch))
+        depth = tail_depth.ravel()[flat]
+        order = np.argsort(depth)  # order within a level does not matter
+        up = which[order] * n + tails[edge[order]]
+        down = which[order] * n + heads[edge[order]]
+        bounds = np.searchsorted(depth[order], np.arange(depth.max() + 2))
+        levels = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        # Forward: shortest-path counts level by level
+        paths = np.zeros(len(batch) * n)
+        paths[roots] = 1.0
+        for start, end in levels:
+            np.add.at(paths, down[start:end], paths[up[start:end]])
+
+        # Backward: accumulate dependencies from the deepest level up
+        dependency = np.zeros(len(batch) * n)
+        for start, end in reversed(levels):
+            u, v = up[start:end], down[start:end]
+            np.add.at(dependency, u, paths[u] / paths[v] * (1.0 + dependency[v]))
+
+        dependency[roots] = 0.0
+        centrality += dependency.reshape(len(batch), n).sum(axis=0)
+
+    # Scale sampled sources to n, then normalize for an undirected graph
+    centrality *= n / len(sources)
+    return centrality / ((n - 1) * (n - 2))
+
+def core_numbers(adjacency):
+    """
+    k-core number of every node (largest k such that the node is in a
+    subgraph where every node has degree >= k), by Batagelj-Zaversnik
+    bucket peeling in O(edges).
+    """
+    links = adjacency.tocsr()
+    indptr, indices = links.indptr.tolist(), links.indices.tolist()
+    n = len(indptr) - 1
+    degree = np.diff(links.indptr).tolist()
+
+    # Nodes sorted by degree; start[d] is where degree d begins in that order
+    start = np.concatenate(([0], np.cumsum(np.bincount(degree, minlength=1))))[:-1].tolist()
+    vert = np.argsort(degree, kind='stable').tolist()
+    pos = [0] * n
+    for i, v in enumerate(vert):
+        pos[v] = i
+
+    for v in vert:
+        for u in indices[indptr[v]:indptr[v + 1]]:
+            if degree[u] > degree[v]:
+                # Move u to the front of its bucket, then into the bucket below
+                du, pu = degree[u], pos[u]
+                pw = start[du]
+                w = vert[pw]
+                if u != w:
+                    pos[u], pos[w] = pw, pu
+                    vert[pu], vert[pw] = w, u
+                start[du] += 1
+                degree[u] -= 1
+    return np.array(degree, dtype=np.int64)
+
+def compute_centrality(graph, type_weights=None, betweenness_samples=BETWEENNESS_SAMPLES):
+    """
+    Centrality measures from one sparse adjacency build.
+
+    Returns:
+        {node_id: {weighted_degree, pagerank, betweenness, core_number}}
+    """
+    node_ids, adjacency = build_adjacency(graph, type_weights or IMPACT_EDGE_WEIGHTS)
+    weighted_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    ranks = pagerank(adjacency)
+    betweenness = approximate_betweenness(adjacency, samples=betweenness_samples)
+    cores = core_numbers(adjacency)
+
+    return {
+        node_id: {
+            "weighted_degree": round(float(weighted_degree[i]), 4),
+            "pagerank": round(float(ranks[i]), 6),
+            "betweenness": round(float(betweenness[i]), 6),
+            "core_number": int(cores[i])
+        }
+        for i, node_id in enumerate(node_ids)
+    }
+
+def annotate_centrality(graph, **kwargs):
+    """Write compute_centrality() measures onto graph['nodes']; returns the measures"""
+    centrality = compute_centrality(graph, **kwargs)
+    for node in graph['nodes']:
+        node.update(centrality[node['id']])
+    return centrality
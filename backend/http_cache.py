@@ -0,0 +1,117 @@
+"""
+Transmute - HTTP Caching
+ETags from artifact versions, 304 handling and response compression for the API
+"""
+
+import gzip
+import hashlib
+import os
+import zlib
+from functools import wraps
+from flask import Response, request
+from dotenv import load_dotenv
+from corpus_cache import corpus_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "0"))          # seconds clients may skip revalidation
+API_COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
+API_COMPRESS_LEVEL = int(os.getenv("API_COMPRESS_LEVEL", "6"))        # gzip level; brotli uses quality 5
+
+def negotiate_encoding():
+    """'br', 'gzip' or None, from the request's Accept-Encoding"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def cache_control():
+    return f"public, max-age={API_CACHE_MAX_AGE}, must-revalidate"
+
+def conditional(*artifacts):
+    """
+    Decorator for read endpoints served from artifact files.
+
+    The strong ETag is derived from the artifacts' content versions
+    (corpus_cache.artifact_version) and the query string, plus the response encoding, so it
+    changes exactly when the response bytes would. A matching If-None-Match
+    gets a 304 without the view running.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                versions = [corpus_cache.artifact_version(path) for path in artifacts]
+            except FileNotFoundError:
+                # The view reports the missing artifact
+                return view(*args, **kwargs)
+
+            encoding = negotiate_encoding()
+            digest = hashlib.sha256("\x1f".join([*versions, request.full_path]).encode('utf-8')).hexdigest()
+            etag = f"{digest[:32]}-{encoding}" if encoding else digest[:32]
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = view(*args, **kwargs)
+                if isinstance(response, tuple) or response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control()
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(API_COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+def compress_response(response):
+    """
+    after_request hook: gzip/brotli-encode JSON responses by Accept-Encoding.
+    Streamed responses are compressed chunk by chunk.
+    """
+    if (response.status_code != 200 or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = negotiate_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < API_COMPRESS_MIN_BYTES:
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=5))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=API_COMPRESS_LEVEL))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
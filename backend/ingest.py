@@ -3,16 +3,13 @@ Transmute - Document Ingestion
 Reads markdown files, generates embeddings, and creates documents.json
 """
 
-import json
 import os
 import re
+import sys
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-
-# Initialize embedding model (fast and lightweight for hackathon)
-print("Loading embedding model...")
-model = SentenceTransformer('all-MiniLM-L6-v2')
-print("[OK] Model loaded")
+from chunking import save_corpus_embeddings, PASSAGES_FILE
+from corpus_sync import assign_stable_ids, embed_documents, load_existing_documents, summarize_delta
+from embedding_store import EMBEDDING_DTYPE, DOCUMENT_EMBEDDINGS, PASSAGE_EMBEDDINGS, save_json
 
 def extract_date_from_filename(filename):
     """Extract date from filename like '2024-01-project-kickoff.md'"""
@@ -40,13 +37,15 @@ def count_words(text):
     """Simple word counter"""
     return len(text.split())
 
-def ingest_documents(data_folder="test-files"):
+def ingest_documents(data_folder="test-files", batch_size=None, workers=None, incremental=False):
     """
     Main ingestion function:
     1. Read all .md files from data_folder
     2. Extract metadata (title, date, content)
-    3. Generate embeddings
-    4. Save to documents.json
+    3. Assign stable ids and diff against the existing corpus
+    4. Split into passages and generate embeddings (batched; only
+       added/changed files when incremental=True)
+    5. Save metadata to documents.json/passages.json, embeddings to binary stores
     """
 
     documents = []
@@ -81,34 +80,46 @@ def ingest_documents(data_folder="test-files"):
         print(f"  Date: {date}")
         print(f"  Words: {word_count}")
 
-        # Generate embedding
-        print(f"  Generating embedding...", end=" ")
-        embedding = model.encode(content).tolist()
-        print(f"[OK] ({len(embedding)} dimensions)")
-
-        # Build document object
+        # Build document object (id and embedding added by the stages below)
         doc = {
-            "id": f"doc_{idx+1}",
             "title": title,
             "date": date,
             "content": content,
             "word_count": word_count,
             "filename": file_path.name,
-            "embedding": embedding
+            "source_path": file_path.relative_to(folder_path).as_posix(),
+            "size_bytes": file_path.stat().st_size
         }
 
         documents.append(doc)
 
+    # Stable ids: unchanged files keep theirs, new files get a content-hash id
+    existing = load_existing_documents()
+    delta = assign_stable_ids(documents, existing)
+    changes = summarize_delta(delta)
+    print(f"\n[CHANGES] Added: {changes['added']}, changed: {changes['changed']}, "
+          f"removed: {changes['removed']}, unchanged: {changes['unchanged']}")
+
+    # Chunk documents and generate passage embeddings in batches
+    print("\nGenerating passage embeddings...")
+    passages, passage_embeddings, document_embeddings = embed_documents(
+        documents, existing, delta if incremental else None, batch_size=batch_size, workers=workers
+    )
+    print(f"[OK] {len(passages)} passage embeddings ({passage_embeddings.shape[1]} dimensions)")
+
     # Save to JSON
     output_file = "documents.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(documents, f, indent=2)
+    save_json(output_file, documents)
 
     print("\n" + "=" * 60)
     print(f"[SUCCESS] Processed {len(documents)} documents")
     print(f"[SAVED] File: {output_file}")
     print(f"[SIZE] {os.path.getsize(output_file) / 1024:.1f} KB")
 
+    save_corpus_embeddings(documents, passages, passage_embeddings, document_embeddings)
+    print(f"[SAVED] Passage index: {PASSAGES_FILE} ({len(passages)} passages)")
+    print(f"[SAVED] Embeddings: {DOCUMENT_EMBEDDINGS}, {PASSAGE_EMBEDDINGS} stores ({EMBEDDING_DTYPE})")
+
     # Summary stats
     total_words = sum(doc['word_count'] for doc in documents)
     print(f"\n[SUMMARY]")
@@ -122,8 +133,8 @@ if __name__ == "__main__":
     print("Transmute - Document Ingestion")
     print("=" * 60)
 
-    # Run ingestion
-    docs = ingest_documents("test-files")
+    # Run ingestion (--incremental re-embeds only added/changed files)
+    docs = ingest_documents("test-files", incremental="--incremental" in sys.argv)
 
     if docs:
         print("\n[COMPLETE] Ingestion finished! Ready for graph building.")
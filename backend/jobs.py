@@ -0,0 +1,130 @@
+"""
+Transmute - Background Jobs
+Bounded job queue and worker pool for uploads, with per-stage progress
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "8"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "100"))
+
+class JobQueueFull(Exception):
+    """Raised when JOB_QUEUE_LIMIT jobs are already queued or running"""
+
+class Job:
+    """State of one background job; updated by the worker, read by the API"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def update(self, stage=None, **progress):
+        """Progress callback handed to pipeline stages: update(stage='embedding', files_embedded=3)"""
+        with self.lock:
+            if stage is not None:
+                self.stage = stage
+            self.progress.update(progress)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+
+class JobManager:
+    """
+    Runs jobs on a fixed worker pool.
+    Rejects new jobs once queue_limit are pending, so a burst of uploads
+    cannot queue unbounded work; finished jobs are kept for polling up to
+    history_limit.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT, history_limit=JOB_HISTORY_LIMIT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transmute-job")
+        self.queue_limit = queue_limit
+        self.history_limit = history_limit
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        """
+        Queue fn(*args, progress=job.update).
+        fn returns a result dict; a dict with an 'error' key marks the job failed.
+        """
+        with self.lock:
+            if self.pending >= self.queue_limit:
+                raise JobQueueFull(f"{self.pending} jobs already pending")
+            job = Job(kind)
+            self.jobs[job.id] = job
+            self.pending += 1
+            self._trim_history()
+
+        self.executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        with job.lock:
+            job.status = "running"
+            job.started_at = time.time()
+
+        try:
+            result = fn(*args, progress=job.update)
+            error = result.get('error') if isinstance(result, dict) else None
+        except Exception as e:
+            result, error = None, f"Job failed: {str(e)}"
+
+        with job.lock:
+            job.status = "failed" if error else "succeeded"
+            job.result = None if error else result
+            job.error = error
+            job.stage = job.stage if error else "done"
+            job.finished_at = time.time()
+
+        with self.lock:
+            self.pending -= 1
+
+    def _trim_history(self):
+        # Oldest finished jobs go first; queued/running jobs are never dropped
+        excess = len(self.jobs) - self.history_limit
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].status in ("succeeded", "failed"):
+                del self.jobs[job_id]
+                excess -= 1
+
+    def get(self, job_id):
+        """Job by id, or None"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+# Shared process-wide manager
+job_manager = JobManager()
@@ -0,0 +1,52 @@
+"""
+Transmute - LLM Response Cache
+On-disk SQLite cache of Gemini results, keyed by backend, model, prompt version and content hashes
+"""
+
+import hashlib
+import os
+import threading
+from dotenv import load_dotenv
+from llm_executor import LLM_BACKEND
+from sqlite_cache import SQLiteLRUCache
+
+load_dotenv()
+
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+def content_hash(text):
+    """SHA-256 of a string"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def document_hash(doc):
+    """Hash of every document field that goes into a prompt"""
+    return content_hash(f"{doc['title']}\x1f{doc['date']}\x1f{doc['content']}")
+
+def cache_key(model_name, prompt_version, *content_hashes):
+    """Cache key: changes whenever the backend, the model, the prompt template or any input changes"""
+    return content_hash("\x1f".join([LLM_BACKEND, str(model_name), prompt_version, *content_hashes]))
+
+# Opened on first use so importing a stage never touches the disk
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Shared cache instance, or None when LLM_CACHE_ENABLED=0"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = SQLiteLRUCache(LLM_CACHE_FILE, int(LLM_CACHE_MAX_MB * 1024 * 1024), table="responses")
+    return _llm_cache
+
+def cache_get(key):
+    cache = get_llm_cache()
+    return cache.get(key) if cache else None
+
+def cache_put(key, kind, value):
+    cache = get_llm_cache()
+    if cache:
+        cache.put(key, kind, value)
@@ -0,0 +1,138 @@
+"""
+Transmute - LLM Execution
+Concurrent, rate-limited Gemini calls with retry and backoff
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tuning (override in .env to match your Gemini quota)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+
+# "gemini" (default) or "stub" for a local canned-response model
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity` (rate <= 0: unlimited)"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubModel:
+    """
+    Local stand-in for genai.GenerativeModel (LLM_BACKEND=stub).
+    Answers every prompt with `respond(prompt)`; the default reply satisfies
+    both the relationship and the contradiction parsers.
+    """
+
+    def __init__(self, respond=None, latency=0.0):
+        self.respond = respond or (lambda prompt: json.dumps({
+            "relationship": "relates_to",
+            "explanation": "Stub model response",
+            "doc1_claim": "Stub claim",
+            "doc2_claim": "Stub claim",
+            "conflict_summary": "Stub model response"
+        }))
+        self.latency = latency
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return StubResponse(self.respond(prompt))
+
+def create_model(model_name=None):
+    """Configured Gemini model, or a StubModel when LLM_BACKEND=stub"""
+    if LLM_BACKEND == "stub":
+        return StubModel()
+
+    # Import here so the stub backend works without the Gemini SDK
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(model_name or os.getenv("GEMINI_MODEL"))
+
+# One limiter per process: the quota belongs to the API key, not to a stage
+rate_limiter = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60.0, capacity=max(LLM_MAX_CONCURRENCY, 1))
+
+def generate(model, prompt, max_retries=None):
+    """
+    Rate-limited model.generate_content() with exponential backoff
+    (the stub model is not rate-limited).
+    Returns the response text; raises the last error once retries run out.
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(max_retries + 1):
+        if not isinstance(model, StubModel):  # local stub: no quota to respect
+            rate_limiter.acquire()
+        try:
+            return model.generate_content(prompt).text
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = LLM_RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random())
+            print(f"  LLM call failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def run_concurrently(fn, items, max_concurrency=None, on_done=None):
+    """
+    Call fn(item) for every item on a bounded thread pool.
+
+    Args:
+        fn: Function of one item (typically wraps an LLM call)
+        items: Inputs
+        max_concurrency: Parallel calls in flight (default: LLM_MAX_CONCURRENCY)
+        on_done: Optional callback(index, item, result) as each call finishes
+
+    Returns:
+        Results in the same order as items
+    """
+    items = list(items)
+    max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items))) as pool:
+        futures = {pool.submit(fn, item): idx for idx, item in enumerate(items)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            if on_done:
+                on_done(idx, items[idx], results[idx])
+
+    return results
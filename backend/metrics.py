@@ -6,6 +6,8 @@ Calculates cognitive load reduction and storage savings
 import json
 import os
 from pathlib import Path
+from dedup import find_duplicates, document_size
+from embedding_store import save_json
 
 def load_graph():
     """Load the enhanced graph.json"""
@@ -18,49 +20,27 @@ def load_documents():
         return json.load(f)
 
 def calculate_file_sizes(documents):
-    """
-    Calculate estimated file sizes based on word count
-    Rough estimate: 1 word ≈ 6 bytes (average English word length)
-    """
-    sizes = {}
-    for doc in documents:
-        # Estimate: word_count * 6 bytes per word
-        estimated_bytes = doc['word_count'] * 6
-        sizes[doc['id']] = estimated_bytes
-    return sizes
-
-def find_duplicate_concepts(graph, similarity_threshold=0.8):
-    """
-    Find edges with very high similarity (potential duplicates/redundant docs)
-    """
-    duplicates = []
+    """Real size in bytes of each document (source file size, else UTF-8 text length)"""
+    return {doc['id']: document_size(doc) for doc in documents}
 
-    for edge in graph.get('edges', []):
-        if edge.get('similarity', 0) > similarity_threshold:
-            duplicates.append({
-                'doc1': edge['source'],
-                'doc2': edge['target'],
-                'similarity': edge['similarity'],
-                'type': edge['type']
-            })
-
-    return duplicates
-
-def calculate_metrics():
+def calculate_metrics(graph=None, documents=None, duplicates=None):
     """
     Main metrics calculation:
     1. Count total docs, obsolete docs, duplicates
     2. Calculate cognitive load reduction
     3. Estimate storage savings
+    graph/documents can be passed in-memory (pipeline.py); otherwise loaded from disk
+    duplicates: find_duplicates() result from the dedup stage; computed here when omitted
     """
 
     print("Transmute - Sustainability Metrics")
     print("=" * 60)
 
     # Load data
-    print("\nLoading data...")
-    graph = load_graph()
-    documents = load_documents()
+    if graph is None or documents is None:
+        print("\nLoading data...")
+        graph = graph if graph is not None else load_graph()
+        documents = documents if documents is not None else load_documents()
     insights = graph.get('insights', [])
 
     # Basic counts
@@ -72,9 +52,11 @@ def calculate_metrics():
     obsolete_count = len(obsolete_insights)
     obsolete_doc_ids = [i['obsolete_doc'] for i in obsolete_insights]
 
-    # Find duplicate/highly similar documents
-    duplicates = find_duplicate_concepts(graph, similarity_threshold=0.8)
-    duplicate_count = len(duplicates)
+    # Exact and near-duplicate documents (one copy per group is kept)
+    if duplicates is None:
+        duplicates = find_duplicates(documents)
+    duplicate_count = duplicates['removable_docs']
+    duplicate_doc_ids = {doc_id for group in duplicates['groups'] for doc_id in group['duplicates']}
 
     # Count contradictions (also contribute to cognitive load)
     contradictions = [i for i in insights if i['type'] == 'contradiction']
@@ -89,7 +71,7 @@ def calculate_metrics():
     print("\n[COGNITIVE LOAD ANALYSIS]")
     print(f"  Problematic documents: {problematic_items}/{total_docs}")
     print(f"    - Obsolete: {obsolete_count}")
-    print(f"    - High duplicates: {duplicate_count}")
+    print(f"    - Duplicates: {duplicate_count} in {len(duplicates['groups'])} groups")
     print(f"    - Contradictions: {contradiction_count}")
     print(f"  Cognitive load reduction: {cognitive_load_reduction:.1f}%")
 
@@ -97,22 +79,16 @@ def calculate_metrics():
     # Calculate file sizes
     file_sizes = calculate_file_sizes(documents)
 
-    # Calculate size of obsolete documents
-    obsolete_size = sum(file_sizes.get(doc_id, 0) for doc_id in obsolete_doc_ids)
+    # Calculate size of obsolete documents (removable duplicates are counted below instead)
+    obsolete_size = sum(file_sizes.get(doc_id, 0) for doc_id in set(obsolete_doc_ids) - duplicate_doc_ids)
 
     # Estimate savings: 70% of obsolete docs can be archived (compressed/removed)
     storage_savings_bytes = obsolete_size * 0.7
     storage_savings_kb = storage_savings_bytes / 1024
 
-    # Also count duplicate sizes
-    duplicate_size = 0
-    for dup in duplicates:
-        # Smaller of the two duplicates could potentially be removed
-        size1 = file_sizes.get(dup['doc1'], 0)
-        size2 = file_sizes.get(dup['doc2'], 0)
-        duplicate_size += min(size1, size2)
-
-    duplicate_savings_bytes = duplicate_size * 0.5  # 50% savings from deduplication
+    # Removing duplicate copies frees their full size
+    duplicate_size = duplicates['removable_bytes']
+    duplicate_savings_bytes = duplicate_size
     duplicate_savings_kb = duplicate_savings_bytes / 1024
 
     total_storage_savings = storage_savings_kb + duplicate_savings_kb
@@ -154,6 +130,7 @@ def calculate_metrics():
             "reduction_percent": round(cognitive_load_reduction, 1),
             "obsolete_docs": obsolete_count,
             "duplicates": duplicate_count,
+            "duplicate_groups": len(duplicates['groups']),
             "contradictions": contradiction_count,
             "total_problematic": problematic_items
         },
@@ -176,8 +153,7 @@ def calculate_metrics():
     }
 
     # Save metrics
-    with open('metrics.json', 'w') as f:
-        json.dump(metrics, f, indent=2)
+    save_json('metrics.json', metrics)
 
     print("\n" + "=" * 60)
     print("[SAVED] metrics.json")
@@ -0,0 +1,128 @@
+"""
+Transmute - Obsolescence Engine
+Time-ordered supersession DAG from 'updates' edges: chains and their current heads
+"""
+
+def _known(date):
+    return bool(date) and date != 'unknown'
+
+def orient_update(edge, doc_index):
+    """
+    (newer_id, older_id) for an 'updates' edge.
+    Document dates decide when both are known and differ; otherwise the
+    edge direction does (source updates target).
+    """
+    source, target = doc_index.get(edge['source']), doc_index.get(edge['target'])
+    source_date, target_date = source.get('date'), target.get('date')
+    if _known(source_date) and _known(target_date) and source_date != target_date:
+        return (edge['source'], edge['target']) if source_date > target_date else (edge['target'], edge['source'])
+    return edge['source'], edge['target']
+
+def resolve_supersession(graph, doc_index):
+    """
+    Build the supersession DAG (older -> newer) and resolve every chain to its head.
+
+    One depth-first pass visits each node and edge once. An edge back to a
+    document still on the DFS stack closes a cycle (possible only among
+    undated documents); only those edges are dropped, so documents before or
+    after a cycle keep their chains. Reverse finishing order is a topological
+    order of the remaining edges, and walking it backwards gives each document
+    its head, the newest document reachable from it. When a document was
+    superseded along several branches, the branch whose head is newest wins
+    (ties: the head seen first).
+
+    Returns:
+        {
+          "updates": [(newer_id, older_id, edge)],  # oriented, cycle-free
+          "head": {doc_id: head_id},                # superseded documents only
+          "next": {doc_id: newer_id},               # step towards the head
+          "depth": {doc_id: steps},                 # steps from the document to its head
+          "chains": {head_id: [doc_id, ...]}        # superseded docs, oldest first
+        }
+    """
+    newer_of, indegree, oriented = {}, {}, {}
+    for edge in graph['edges']:
+        if edge['type'] != 'updates' or edge['source'] not in doc_index or edge['target'] not in doc_index:
+            continue
+        newer, older = orient_update(edge, doc_index)
+        if newer == older or (newer, older) in oriented:
+            continue
+        oriented[(newer, older)] = edge
+        newer_of.setdefault(older, []).append(newer)
+        indegree[newer] = indegree.get(newer, 0) + 1
+        indegree.setdefault(older, 0)
+
+    # Depth-first search from the oldest versions, then from whatever is only
+    # reachable through a cycle; state: 1 = on the stack, 2 = finished
+    state, finished, back_edges = {}, [], set()
+    roots = [node for node, degree in indegree.items() if degree == 0]
+    for root in roots + list(indegree):
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(newer_of.get(root, [])))]
+        while stack:
+            node, successors = stack[-1]
+            for newer in successors:
+                if newer not in state:
+                    state[newer] = 1
+                    stack.append((newer, iter(newer_of.get(newer, []))))
+                    break
+                if state[newer] == 1:
+                    back_edges.add((newer, node))  # closes a cycle
+            else:
+                state[node] = 2
+                finished.append(node)
+                stack.pop()
+
+    # Topological order of the cycle-free edges, oldest versions first
+    order = finished[::-1]
+
+    # Reverse pass: a node's head is the newest head among its successors
+    head, step, depth = {}, {}, {}
+    for node in reversed(order):
+        best = None
+        for newer in newer_of.get(node, []):
+            if (newer, node) in back_edges:
+                continue
+            candidate = head.get(newer, newer)
+            if best is None or _head_key(candidate, doc_index) > _head_key(best[1], doc_index):
+                best = (newer, candidate)
+        if best is not None:
+            step[node], head[node] = best
+            depth[node] = depth.get(best[0], 0) + 1
+
+    chains = {}
+    for node in order:
+        if node in head:
+            chains.setdefault(head[node], []).append(node)
+    for members in chains.values():
+        members.sort(key=lambda doc_id: doc_index.get(doc_id).get('date', 'unknown'))
+
+    updates = [
+        (newer, older, edge) for (newer, older), edge in oriented.items()
+        if (newer, older) not in back_edges
+    ]
+    return {"updates": updates, "head": head, "next": step, "depth": depth, "chains": chains}
+
+def _head_key(doc_id, doc_index):
+    # Newest dated head wins; undated heads rank below any date
+    date = doc_index.get(doc_id).get('date')
+    return date if _known(date) else ""
+
+def supersession_insights(resolution, doc_index):
+    """One 'supersession' insight per chain head: which documents it replaces, directly or transitively"""
+    insights = []
+    for head_id, superseded in resolution['chains'].items():
+        head_doc = doc_index.get(head_id)
+        insights.append({
+            "type": "supersession",
+            "nodes": [head_id, *superseded],
+            "head": head_id,
+            "head_title": head_doc['title'],
+            "head_date": head_doc['date'],
+            "superseded": superseded,
+            "superseded_titles": [doc_index.get(doc_id)['title'] for doc_id in superseded],
+            "chain_length": max(resolution['depth'][doc_id] for doc_id in superseded) + 1
+        })
+    return insights
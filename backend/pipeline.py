@@ -0,0 +1,118 @@
+"""
+Transmute - Pipeline
+Runs graph building, analysis and metrics in-process, passing data between stages in memory
+"""
+
+import time
+from build_graph import build_graph, update_graph, load_documents
+from analyze import analyze_graph
+from metrics import calculate_metrics
+from dedup import find_duplicates, save_duplicates
+from corpus_cache import corpus_cache, GRAPH_FILE, DOCUMENTS_FILE
+from summary import build_summary, save_summary, file_version
+from document_index import DocumentIndex
+from columnar import write_columnar, columnar_available, ARTIFACT_FORMAT, FORMATS
+from corpus_store import get_corpus_store, CORPUS_DB_ENABLED
+from embedding_store import embeddings_for
+
+# Same defaults as running the stage scripts by hand
+SIMILARITY_THRESHOLD = 0.4
+MAX_EDGES = 15
+MAX_CONTRADICTIONS = 5
+
+def _timed(timings, stage, fn, *args, **kwargs):
+    """Run one stage and record its wall time in seconds"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = round(time.perf_counter() - start, 3)
+    print(f"[TIMING] {stage}: {timings[stage]:.2f}s")
+    return result
+
+def run_pipeline(documents=None, similarity_threshold=SIMILARITY_THRESHOLD, max_edges=MAX_EDGES,
+                 max_contradictions=MAX_CONTRADICTIONS, incremental=False, progress=None):
+    """
+    Run the complete processing pipeline:
+    1. Documents already processed (passed in, or loaded from documents.json)
+    2. Build knowledge graph
+    3. Analyze for insights
+    4. Find duplicate documents and calculate metrics (and the stats summary served by the API)
+
+    Each stage still writes its artifact for the API, but receives its
+    inputs from the previous stage instead of re-reading them.
+    incremental: patch the existing graph.json (update_graph) instead of
+    rebuilding it; the delta is taken from the graph, not from corpus_sync
+    progress: Optional callback(stage=..., **counters) for job status reporting
+
+    Returns:
+        {success, timings, graph, metrics} or {error, timings}
+    """
+    timings = {}
+    progress = progress or (lambda stage=None, **counters: None)
+    try:
+        if documents is None:
+            documents = load_documents()
+
+        print("\n[STEP 2/4] Building knowledge graph...")
+        progress(stage="building_graph")
+        if not incremental:
+            graph = _timed(timings, "build_graph", build_graph,
+                           similarity_threshold=similarity_threshold,
+                           max_edges=max_edges,
+                           documents=documents,
+                           progress=progress)
+        else:
+            graph = _timed(timings, "build_graph", update_graph,
+                           similarity_threshold=similarity_threshold,
+                           max_edges=max_edges,
+                           documents=documents,
+                           progress=progress)
+
+        print("\n[STEP 3/4] Analyzing for insights...")
+        progress(stage="analyzing")
+        graph = _timed(timings, "analyze", analyze_graph,
+                       max_contradictions=max_contradictions,
+                       graph=graph,
+                       documents=documents,
+                       doc_index=DocumentIndex(documents))
+
+        print("\n[STEP 4/4] Finding duplicates and calculating metrics...")
+        duplicates = _timed(timings, "dedup", find_duplicates, documents, progress=progress)
+        save_duplicates(duplicates)
+        progress(stage="metrics")
+        metrics = _timed(timings, "metrics", calculate_metrics,
+                         graph=graph, documents=documents, duplicates=duplicates)
+
+        # Stats and insight indexes for the API, computed once per run
+        sources = {GRAPH_FILE: file_version(GRAPH_FILE), DOCUMENTS_FILE: file_version(DOCUMENTS_FILE)}
+        _timed(timings, "summary", lambda: save_summary(build_summary(graph, documents, sources)))
+
+        # Optional columnar copies for projected / filtered reads (ARTIFACT_FORMAT=parquet|arrow)
+        if ARTIFACT_FORMAT in FORMATS:
+            if columnar_available():
+                _timed(timings, "columnar", write_columnar, graph, documents, sources)
+            else:
+                print(f"[WARN] ARTIFACT_FORMAT={ARTIFACT_FORMAT} needs pyarrow; wrote JSON artifacts only")
+
+        # Indexed SQLite copy for the API and standalone stages; readers keep the old snapshot until commit
+        if CORPUS_DB_ENABLED:
+            _timed(timings, "corpus_store", lambda: get_corpus_store(create=True).replace(
+                graph, documents, sources, embeddings_for(documents)))
+
+        # New artifacts are on disk: drop everything the API has cached
+        corpus_cache.invalidate()
+
+        print("\n[SUCCESS] Pipeline complete!")
+        return {"success": True, "timings": timings, "graph": graph, "metrics": metrics}
+
+    except Exception as e:
+        return {"error": f"Pipeline execution failed: {str(e)}", "timings": timings}
+
+if __name__ == "__main__":
+    print("Transmute - Pipeline")
+    print("=" * 60)
+
+    result = run_pipeline()
+    if 'error' in result:
+        print(f"[ERROR] {result['error']}")
+    else:
+        print(f"[TIMINGS] {result['timings']}")
@@ -0,0 +1,91 @@
+"""
+Transmute - SQLite Cache
+Size-capped, least-recently-used key/value cache in one SQLite table
+(backs the LLM response cache and the extracted PDF text cache)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Puts between re-reading the total size from the table (picks up writes by other processes)
+RESYNC_PUTS = 1000
+
+class SQLiteLRUCache:
+    """
+    Thread-safe on-disk key/value store of JSON-serializable values in one SQLite table.
+    Least recently used entries are evicted once the total size exceeds max_bytes.
+    `kind` labels what an entry holds (e.g. "relationship", "pdf_text").
+    The total size is kept as a running count, so a put does not scan the table.
+    """
+
+    def __init__(self, path, max_bytes, table="entries"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.table = table
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_used ON {table}(last_used)")
+        self.conn.commit()
+        self._resync()
+
+    def _resync(self):
+        self.total = self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        self.puts = 0
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        with self.lock:
+            row = self.conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, kind, value):
+        """Store a value, then evict old entries if over the size cap"""
+        payload = json.dumps(value)
+        with self.lock:
+            replaced = self.conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, kind, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, payload, len(payload), time.time())
+            )
+            self.total += len(payload) - (replaced[0] if replaced else 0)
+            self.puts += 1
+            if self.puts >= RESYNC_PUTS:
+                self._resync()
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.total <= self.max_bytes:
+            return
+
+        # Walk from least recently used until enough space is freed
+        excess = self.total - self.max_bytes
+        doomed = []
+        for key, size in self.conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_used"):
+            doomed.append((key,))
+            excess -= size
+            self.total -= size
+            if excess <= 0:
+                break
+        self.conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+
+    def stats(self):
+        """Entry count and total size in bytes"""
+        with self.lock:
+            count, size = self.conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return {"entries": count, "bytes": size}
@@ -0,0 +1,101 @@
+"""
+Transmute - Corpus Summary
+Stats and insight indexes computed once per pipeline run (summary.json)
+"""
+
+import hashlib
+import json
+from embedding_store import save_json
+
+SUMMARY_FILE = "summary.json"
+
+def file_version(path):
+    """SHA-256 of a file's bytes (same version corpus_cache assigns on load)"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _count_by(items, key):
+    counts = {}
+    for item in items:
+        counts[item[key]] = counts.get(item[key], 0) + 1
+    return counts
+
+def build_summary(graph, documents, sources=None):
+    """
+    Aggregates served by /api/stats and /api/insights.
+
+    Insights are indexed by type and by node (positions in graph['insights']),
+    so filtered lookups never scan the whole list.
+
+    Args:
+        sources: {artifact path: version} the summary was computed from;
+            lets readers detect a summary older than the artifacts
+
+    Returns:
+        Summary dict
+    """
+    insights = graph.get('insights', [])
+    total_words = sum(doc['word_count'] for doc in documents)
+    insight_counts = _count_by(insights, 'type')
+
+    insights_by_type, insights_by_node = {}, {}
+    for idx, insight in enumerate(insights):
+        insights_by_type.setdefault(insight['type'], []).append(idx)
+        for node_id in insight.get('nodes', []):
+            insights_by_node.setdefault(node_id, []).append(idx)
+
+    return {
+        "sources": sources or {},
+        "stats": {
+            "documents": {
+                "total": len(documents),
+                "total_words": total_words,
+                "avg_words": total_words // len(documents) if documents else 0
+            },
+            "relationships": {
+                "total": len(graph['edges']),
+                "by_type": _count_by(graph['edges'], 'type')
+            },
+            "insights": {
+                "total": len(insights),
+                "contradictions": insight_counts.get('contradiction', 0),
+                "obsolete": insight_counts.get('obsolete', 0),
+                "by_type": insight_counts
+            }
+        },
+        "insights_by_type": insights_by_type,
+        "insights_by_node": insights_by_node
+    }
+
+def save_summary(summary, output_file=SUMMARY_FILE):
+    save_json(output_file, summary)
+    print(f"[SAVED] Summary: {output_file}")
+
+def insight_positions(summary, insight_type=None, node_id=None):
+    """Sorted positions of the insights matching a type and/or node, or None for all of them"""
+    if insight_type is None and node_id is None:
+        return None
+
+    matches = None
+    if insight_type is not None:
+        matches = set(summary['insights_by_type'].get(insight_type, []))
+    if node_id is not None:
+        by_node = set(summary['insights_by_node'].get(node_id, []))
+        matches = by_node if matches is None else matches & by_node
+    return sorted(matches)
+
+def filter_insights(insights, summary, insight_type=None, node_id=None):
+    """Insights matching a type and/or node, via the summary's indexes"""
+    positions = insight_positions(summary, insight_type, node_id)
+    if positions is None:
+        return insights
+    return [insights[idx] for idx in positions]
+
+if __name__ == "__main__":
+    with open('graph.json', 'r') as f:
+        graph = json.load(f)
+    with open('documents.json', 'r') as f:
+        documents = json.load(f)
+
+    sources = {"graph.json": file_version('graph.json'), "documents.json": file_version('documents.json')}
+    save_summary(build_summary(graph, documents, sources))
@@ -0,0 +1,338 @@
+"""
+Transmute - Text Extraction
+Turns uploaded file bytes into text; PDFs are parsed in worker processes
+"""
+
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlite_cache import SQLiteLRUCache
+
+load_dotenv()
+
+# PDF parsing is CPU-bound and holds the GIL, so it runs in worker processes
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))  # seconds per file (or page range)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "64"))     # larger PDFs are split across workers
+
+# Extracted PDF text, keyed by file SHA-256 + extractor version (re-uploads skip parsing)
+EXTRACTION_CACHE_FILE = os.getenv("EXTRACTION_CACHE_FILE", os.path.join(".cache", "extraction_cache.sqlite3"))
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256"))
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1") != "0"
+
+# Bump when extraction output changes; the PyPDF2 version is part of the key too
+EXTRACTOR_VERSION = "pdf-text-v1"
+
+# Workers are never forked from the (multithreaded) API process itself: a forked
+# child could inherit a lock some other thread was holding. The forkserver
+# starts them from a clean single-threaded process; spawn where it is unavailable.
+_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def _pdf_page_texts(pdf_file, start=0, end=None):
+    """Text of pages [start, end) of a PDF (path or binary file object)"""
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    pages = pdf_reader.pages[start:end]
+    return [page.extract_text() or "" for page in pages]
+
+def _join_pages(page_texts):
+    # One newline after every page, same layout as before; built in linear time
+    return "".join(text + "\n" for text in page_texts)
+
+def _pdf_fallback(name):
+    return f"PDF Document: {name}\n\n[PDF text extraction requires PyPDF2 library]"
+
+def extract_text_from_pdf(pdf_path, name=None):
+    """
+    Extract text from PDF file (basic implementation)
+    pdf_path may also be a binary file object (e.g. a ZIP member read into memory)
+    """
+    name = name or Path(pdf_path).name
+    try:
+        return _join_pages(_pdf_page_texts(pdf_path))
+    except ImportError:
+        # Fallback: just return filename as content
+        return _pdf_fallback(name)
+    except Exception as e:
+        return f"Error reading PDF: {str(e)}"
+
+# Opened on first use, like the LLM cache
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache():
+    """Shared extraction cache, or None when EXTRACTION_CACHE_ENABLED=0"""
+    global _extraction_cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = SQLiteLRUCache(EXTRACTION_CACHE_FILE, int(EXTRACTION_CACHE_MAX_MB * 1024 * 1024),
+                                               table="extracted_text")
+    return _extraction_cache
+
+def extraction_key(data):
+    """Cache key for a file's bytes under the current extractor"""
+    import PyPDF2
+    file_hash = hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(f"{EXTRACTOR_VERSION}\x1f{PyPDF2.__version__}\x1f{file_hash}".encode('utf-8')).hexdigest()
+
+def extract_text(name, data):
+    """Text of one file's bytes, by extension"""
+    if Path(name).suffix.lower() == '.pdf':
+        return extract_text_from_pdf(io.BytesIO(data), name)
+    return data.decode('utf-8', errors='ignore')
+
+def _extract_pdf(data):
+    # Worker entry point for a whole PDF; errors propagate so they are not cached
+    return _join_pages(_pdf_page_texts(io.BytesIO(data)))
+
+def _extract_pages(data, start, end):
+    # Worker entry point for one page range of a large PDF
+    return _pdf_page_texts(io.BytesIO(data), start, end)
+
+def _worker_loop(conn):
+    # Worker process body: run (fn, args) jobs from the pipe until it is closed
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+def _pdf_page_count(data):
+    """Page count, or None when the PDF cannot be opened here (the worker reports the error)"""
+    try:
+        import PyPDF2
+        return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    except Exception:
+        return None
+
+class ExtractionWorker:
+    """A worker process that runs one job after another until stopped"""
+
+    def __init__(self):
+        self.conn, child = _MP_CONTEXT.Pipe()
+        self.process = _MP_CONTEXT.Process(target=_worker_loop, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None
+
+    def stop(self, force=False):
+        """Let the worker exit (closing its pipe), or kill it mid-job with force"""
+        if force:
+            self.process.terminate()
+        self.conn.close()
+        self.process.join(timeout=None if force else 5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+class ExtractionJob:
+    """One worker's share of a file (a whole PDF or a page range)"""
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.worker = None
+        self.started_at = None
+        self.done = False
+        self.ok = False
+        self.value = None
+
+class ExtractionTask:
+    """Pending extraction of one file: a finished text, or jobs for its parts"""
+
+    def __init__(self, name, text=None, jobs=None, join=None, cache_key=None):
+        self.name = name
+        self.text = text
+        self.jobs = jobs or []
+        self.join = join
+        self.cache_key = cache_key
+
+class TextExtractor:
+    """
+    Extracts text from file bytes.
+
+    PDFs are parsed by a pool of at most `workers` worker processes, started
+    on demand and reused from job to job; PDFs with more than pages_per_task
+    pages are split into page ranges parsed in parallel. Plain text is
+    decoded in-process, which is cheaper than shipping it to a worker. Each
+    file gets `timeout` seconds once a worker picks it up; files that run
+    over are reported as errors and the workers stuck on them are killed
+    (the pool starts fresh ones as needed). PDFs already in the extraction
+    cache are not parsed at all; successful extractions are added to it.
+
+    submit() may be called from one thread (e.g. a ZIP reader) while another
+    waits in result(); the queue and pool are guarded by a lock.
+
+    Use as a context manager:
+        with TextExtractor() as extractor:
+            tasks = [extractor.submit(name, data) for name, data in files]
+            texts = [extractor.result(task) for task in tasks]
+    """
+
+    def __init__(self, workers=None, timeout=None, pages_per_task=None, cache=None):
+        self.workers = EXTRACTION_WORKERS if workers is None else workers
+        self.timeout = EXTRACTION_TIMEOUT if timeout is None else timeout
+        self.pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+        self.cache = get_extraction_cache() if cache is None else cache
+        self._lock = threading.Lock()
+        self.queued = deque()
+        self.idle = []
+        self.busy = []
+        self.cache_hits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit_job(self, fn, *args):
+        job = ExtractionJob(fn, args)
+        with self._lock:
+            self.queued.append(job)
+            self._start_jobs()
+        return job
+
+    def _start_jobs(self):
+        # Caller holds the lock
+        while self.queued and (self.idle or len(self.busy) < self.workers):
+            worker = self.idle.pop() if self.idle else ExtractionWorker()
+            job = self.queued.popleft()
+            worker.job, job.worker, job.started_at = job, worker, time.monotonic()
+            worker.conn.send((job.fn, job.args))
+            self.busy.append(worker)
+
+    def _finish(self, worker, ok, value, reusable=True):
+        # Caller holds the lock
+        job = worker.job
+        job.done, job.ok, job.value = True, ok, value
+        worker.job = None
+        self.busy.remove(worker)
+        if reusable:
+            self.idle.append(worker)
+        else:
+            worker.stop(force=True)
+
+    def _poll(self, timeout):
+        """Collect results of finished jobs (waiting up to timeout), then start queued ones"""
+        with self._lock:
+            busy = list(self.busy)
+        # Wait without the lock so submit() can keep queueing meanwhile
+        ready = set(wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy],
+                         timeout=timeout)) if busy else set()
+        finished = []
+        for worker in busy:
+            if worker.conn in ready:
+                try:
+                    finished.append((worker, *worker.conn.recv(), True))
+                except EOFError:
+                    finished.append((worker, False, f"worker exited with code {worker.process.exitcode}", False))
+            elif worker.process.sentinel in ready:
+                finished.append((worker, False, f"worker exited with code {worker.process.exitcode}", False))
+        with self._lock:
+            for worker, ok, value, reusable in finished:
+                if worker.job is not None:
+                    self._finish(worker, ok, value, reusable)
+            self._start_jobs()
+
+    def _cancel(self, job):
+        # Drop a queued job, or kill the worker running it; caller holds the lock
+        if job in self.queued:
+            self.queued.remove(job)
+        elif job.worker is not None and job.worker.job is job:
+            self._finish(job.worker, False, "cancelled", reusable=False)
+        job.done = True
+
+    def submit(self, name, data):
+        """Start extracting one file; returns an ExtractionTask for result()"""
+        if Path(name).suffix.lower() != '.pdf':
+            return ExtractionTask(name, text=extract_text(name, data))
+
+        try:
+            key = extraction_key(data)
+        except ImportError:
+            return ExtractionTask(name, text=_pdf_fallback(name))
+
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            self.cache_hits += 1
+            return ExtractionTask(name, text=cached)
+
+        if self.workers <= 1:
+            try:
+                text = _extract_pdf(data)
+            except Exception as e:
+                return ExtractionTask(name, text=f"Error reading PDF: {str(e)}")
+            self._remember(key, text)
+            return ExtractionTask(name, text=text)
+
+        page_count = _pdf_page_count(data)
+        if not page_count or page_count <= self.pages_per_task:
+            job = self._submit_job(_extract_pdf, data)
+            return ExtractionTask(name, jobs=[job], join=lambda parts: parts[0], cache_key=key)
+
+        # Large PDF: at most one page range per worker
+        ranges = min(self.workers, -(-page_count // self.pages_per_task))
+        step = -(-page_count // ranges)
+        jobs = [
+            self._submit_job(_extract_pages, data, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        return ExtractionTask(name, jobs=jobs,
+                              join=lambda parts: _join_pages(text for part in parts for text in part),
+                              cache_key=key)
+
+    def _remember(self, key, text):
+        if self.cache:
+            self.cache.put(key, "pdf_text", text)
+
+    def result(self, task):
+        """Text for a submitted file (an error message if it failed or timed out)"""
+        if task.text is not None:
+            return task.text
+
+        while not all(job.done for job in task.jobs):
+            self._poll(timeout=0.1)
+            started = [job.started_at for job in task.jobs if job.started_at is not None]
+            if (not all(job.done for job in task.jobs) and started
+                    and time.monotonic() - min(started) > self.timeout):
+                with self._lock:
+                    for job in task.jobs:
+                        self._cancel(job)
+                print(f"  [TIMEOUT] {task.name}: no text after {self.timeout:.0f}s")
+                task.text = f"Error reading PDF: extraction timed out after {self.timeout:.0f}s"
+                return task.text
+
+        failed = next((job for job in task.jobs if not job.ok), None)
+        if failed is not None:
+            task.text = f"Error reading PDF: {failed.value}"
+            return task.text
+        task.text = task.join([job.value for job in task.jobs])
+
+        self._remember(task.cache_key, task.text)
+        return task.text
+
+    def close(self):
+        """Stop any extraction still queued or running (results nobody asked for) and the workers"""
+        with self._lock:
+            self.queued.clear()
+            for worker in list(self.busy):
+                self._finish(worker, False, "cancelled", reusable=False)
+            for worker in self.idle:
+                worker.stop()
+            self.idle.clear()
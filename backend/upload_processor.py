@@ -4,54 +4,32 @@ Handles ZIP file uploads, extraction, and pipeline execution
 """
 
 import os
-import json
+import queue
 import shutil
 import zipfile
 import tempfile
-import subprocess
-from pathlib import Path
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from pathlib import Path, PurePosixPath
 import re
+from dotenv import load_dotenv
+from chunking import save_corpus_embeddings
+from embedding_store import save_json
+from corpus_sync import assign_stable_ids, embed_documents, load_existing_documents, summarize_delta
+from pipeline import run_pipeline
+from text_extraction import TextExtractor
 
-# Lazy-load embedding model
-_embedding_model = None
-
-def get_embedding_model():
-    """Lazy-load the embedding model"""
-    global _embedding_model
-    if _embedding_model is None:
-        from sentence_transformers import SentenceTransformer
-        print("Loading embedding model...")
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("[OK] Model loaded")
-    return _embedding_model
-
-def extract_zip(zip_path, extract_to):
-    """Extract ZIP file to target directory"""
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
-        return True
-    except Exception as e:
-        print(f"Error extracting ZIP: {e}")
-        return False
+load_dotenv()
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF file (basic implementation)"""
-    try:
-        # Try using PyPDF2 if available
-        import PyPDF2
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-    except ImportError:
-        # Fallback: just return filename as content
-        return f"PDF Document: {Path(pdf_path).name}\n\n[PDF text extraction requires PyPDF2 library]"
-    except Exception as e:
-        return f"Error reading PDF: {str(e)}"
+SUPPORTED_EXTENSIONS = ['.md', '.txt', '.pdf']
+
+# Limits on what a single upload may decompress to (zip bomb protection)
+UPLOAD_MAX_MEMBERS = int(os.getenv("UPLOAD_MAX_MEMBERS", "5000"))
+UPLOAD_MAX_FILE_MB = float(os.getenv("UPLOAD_MAX_FILE_MB", "25"))
+UPLOAD_MAX_TOTAL_MB = float(os.getenv("UPLOAD_MAX_TOTAL_MB", "500"))
+
+# Decoded members buffered between the ZIP reader thread and document building
+UPLOAD_READ_AHEAD = int(os.getenv("UPLOAD_READ_AHEAD", "16"))
 
 def extract_metadata(content, filename):
     """Extract title and date from content"""
@@ -82,135 +60,199 @@ def extract_metadata(content, filename):
 
     return title, date
 
-def process_uploaded_files(upload_folder):
+def build_document(content, filename, source_path, size_bytes=None):
     """
-    Process all text files from upload folder
-    Supports: .md, .txt, .pdf
-    Returns: documents list ready for embedding
+    Document record for one file's text, or None for empty files (id and embeddings are added by corpus_sync)
+    size_bytes: size of the source file, which dedup savings are measured in
     """
-    documents = []
-    supported_extensions = ['.md', '.txt', '.pdf']
+    if not content.strip():
+        return None
+
+    title, date = extract_metadata(content, filename)
+    return {
+        "title": title,
+        "date": date,
+        "content": content,
+        "word_count": len(content.split()),
+        "filename": filename,
+        "source_path": source_path,
+        "size_bytes": size_bytes if size_bytes is not None else len(content.encode('utf-8'))
+    }
+
+class UploadLimitExceeded(Exception):
+    """Raised when a ZIP would decompress past the upload limits"""
+
+def _read_member(zip_ref, info, max_bytes):
+    """
+    Read one member into memory, stopping at max_bytes of decompressed data.
+    Header sizes can lie, so the limit is enforced on the bytes actually read.
+    Returns None when the member is larger than max_bytes.
+    """
+    chunks, size = [], 0
+    with zip_ref.open(info) as member:
+        while True:
+            chunk = member.read(min(1024 * 1024, max_bytes + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                return None
+    return b"".join(chunks)
+
+def _supported_members(zip_ref):
+    """Supported file entries, skipping directories and macOS resource forks"""
+    members = []
+    for info in zip_ref.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.name.startswith('._') or '__MACOSX' in path.parts:
+            continue
+        if path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            members.append(info)
+    return members
 
-    # Find all supported files recursively
-    all_files = []
-    for ext in supported_extensions:
-        all_files.extend(Path(upload_folder).rglob(f'*{ext}'))
+def read_zip_documents(zip_path, progress=None, max_members=None, max_file_mb=None, max_total_mb=None):
+    """
+    Read supported files straight out of a ZIP, without extracting it to disk.
 
-    if not all_files:
-        return {"error": "No supported files found (.md, .txt, .pdf)"}
+    A reader thread decompresses members and hands them to the extraction
+    pool (PDFs are parsed in worker processes) through a bounded queue, while
+    this thread collects the text in archive order and builds document
+    records, so only UPLOAD_READ_AHEAD files are in flight at once.
 
-    print(f"Found {len(all_files)} files")
+    Limits (default UPLOAD_MAX_*): number of supported members, decompressed
+    size per file (larger files are skipped) and decompressed size in total.
 
-    # Load embedding model
-    model = get_embedding_model()
+    Returns: documents list (not yet embedded), or {"error": ...}
+    """
+    max_members = max_members or UPLOAD_MAX_MEMBERS
+    max_file_bytes = int((max_file_mb or UPLOAD_MAX_FILE_MB) * 1024 * 1024)
+    max_total_bytes = int((max_total_mb or UPLOAD_MAX_TOTAL_MB) * 1024 * 1024)
 
-    for idx, file_path in enumerate(all_files):
+    try:
+        zip_ref = zipfile.ZipFile(zip_path, 'r')
+    except (zipfile.BadZipFile, OSError) as e:
+        print(f"Error opening ZIP: {e}")
+        return {"error": "Failed to read ZIP file"}
+
+    with zip_ref:
+        members = _supported_members(zip_ref)
+        if not members:
+            return {"error": "No supported files found (.md, .txt, .pdf)"}
+        if len(members) > max_members:
+            return {"error": f"ZIP contains {len(members)} files, limit is {max_members}"}
+
+        print(f"Found {len(members)} files")
+        decoded = queue.Queue(maxsize=UPLOAD_READ_AHEAD)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            total_bytes = 0
+            try:
+                for info in members:
+                    if stop.is_set():
+                        return
+                    name = PurePosixPath(info.filename).name
+                    data = _read_member(zip_ref, info, max_file_bytes)
+                    if data is None:
+                        decoded.put((info, None, None, f"larger than {max_file_bytes // (1024 * 1024)}MB"))
+                        continue
+                    total_bytes += len(data)
+                    if total_bytes > max_total_bytes:
+                        raise UploadLimitExceeded(
+                            f"ZIP decompresses to more than {max_total_bytes // (1024 * 1024)}MB"
+                        )
+                    decoded.put((info, len(data), extractor.submit(name, data), None))
+            except Exception as e:
+                decoded.put(e)
+            finally:
+                decoded.put(done)
+
+        extractor = TextExtractor()
+        reader = threading.Thread(target=produce, name="transmute-zip-reader", daemon=True)
+        reader.start()
+
+        documents = []
         try:
-            print(f"[{idx+1}/{len(all_files)}] Processing: {file_path.name}")
-
-            # Read content based on file type
-            if file_path.suffix == '.pdf':
-                content = extract_text_from_pdf(file_path)
-            else:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-
-            # Skip empty files
-            if not content.strip():
-                print(f"  Skipping empty file")
-                continue
-
-            # Extract metadata
-            title, date = extract_metadata(content, file_path.name)
-            word_count = len(content.split())
-
-            # Generate embedding
-            embedding = model.encode(content).tolist()
-
-            # Build document
-            doc = {
-                "id": f"doc_{idx+1}",
-                "title": title,
-                "date": date,
-                "content": content,
-                "word_count": word_count,
-                "filename": file_path.name,
-                "embedding": embedding
-            }
-
-            documents.append(doc)
-            print(f"  [OK] {title}")
-
-        except Exception as e:
-            print(f"  [ERROR] Failed to process {file_path.name}: {e}")
-            continue
+            for idx in range(len(members) + 1):
+                if progress:
+                    progress(stage="reading", files_total=len(members), files_read=idx)
+                item = decoded.get()
+                if item is done:
+                    break
+                if isinstance(item, UploadLimitExceeded):
+                    return {"error": str(item)}
+                if isinstance(item, Exception):
+                    return {"error": f"Failed to read ZIP file: {item}"}
+
+                # size is the bytes actually read; the ZIP header size can lie
+                info, size, task, skipped = item
+                name = PurePosixPath(info.filename).name
+                print(f"[{idx+1}/{len(members)}] Processing: {name}")
+                if skipped:
+                    print(f"  Skipping file {skipped}")
+                    continue
+
+                content = extractor.result(task)
+
+                doc = build_document(content, name, info.filename, size)
+                if doc is None:
+                    print(f"  Skipping empty file")
+                    continue
+
+                documents.append(doc)
+                print(f"  [OK] {doc['title']}")
+        finally:
+            # Unblock the reader if we bailed out early, then let it finish with the ZIP
+            stop.set()
+            while reader.is_alive():
+                try:
+                    decoded.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+            extractor.close()
+
+    if extractor.cache_hits:
+        print(f"[CACHE] {extractor.cache_hits} PDFs reused from the extraction cache")
 
     return documents
 
-def run_pipeline():
+def save_upload(file_storage):
     """
-    Run the complete processing pipeline:
-    1. Documents already processed (documents.json exists)
-    2. Build knowledge graph
-    3. Analyze for insights
-    4. Calculate metrics
+    Save an uploaded ZIP into a fresh working directory.
+    The request stream is gone once the response is sent, so background
+    jobs work from this copy; process_upload removes the directory.
     """
-    try:
-        # Run build_graph.py
-        print("\n[STEP 2/4] Building knowledge graph...")
-        result = subprocess.run(['python', 'build_graph.py'],
-                              capture_output=True, text=True, cwd='.')
-        if result.returncode != 0:
-            return {"error": f"Graph building failed: {result.stderr}"}
-
-        # Run analyze.py
-        print("\n[STEP 3/4] Analyzing for insights...")
-        result = subprocess.run(['python', 'analyze.py'],
-                              capture_output=True, text=True, cwd='.')
-        if result.returncode != 0:
-            return {"error": f"Analysis failed: {result.stderr}"}
-
-        # Run metrics.py
-        print("\n[STEP 4/4] Calculating metrics...")
-        result = subprocess.run(['python', 'metrics.py'],
-                              capture_output=True, text=True, cwd='.')
-        if result.returncode != 0:
-            return {"error": f"Metrics calculation failed: {result.stderr}"}
-
-        print("\n[SUCCESS] Pipeline complete!")
-        return {"success": True}
+    upload_dir = tempfile.mkdtemp(prefix="transmute-upload-")
+    file_storage.save(os.path.join(upload_dir, 'upload.zip'))
+    return upload_dir
 
-    except Exception as e:
-        return {"error": f"Pipeline execution failed: {str(e)}"}
+# Artifacts (documents.json, embeddings, graph.json, ...) are shared by every
+# upload: extraction and reading may overlap, diffing against the existing
+# corpus, embedding, writing and the pipeline may not
+_artifact_lock = threading.Lock()
 
-def process_upload(file_storage):
+def process_upload(upload_dir, incremental=False, progress=None):
     """
     Main upload processing function
-    1. Save uploaded file
-    2. Extract ZIP
-    3. Process documents
-    4. Run pipeline
-    5. Clean up temp files
+    1. Stream documents out of the ZIP saved by save_upload() (no extraction to disk)
+    2. Build document records
+    3. Assign stable ids, diff against the existing corpus
+    4. Chunk and embed (only added/changed files when incremental=True)
+    5. Save artifacts and run pipeline
+    6. Clean up temp files
+
+    progress: Optional callback(stage=..., **counters) for job status reporting
     """
-    temp_dir = None
     try:
-        # Create temp directory
-        temp_dir = tempfile.mkdtemp()
+        zip_path = os.path.join(upload_dir, 'upload.zip')
 
-        # Save uploaded file
-        zip_path = os.path.join(temp_dir, 'upload.zip')
-        file_storage.save(zip_path)
-
-        # Extract ZIP
-        extract_folder = os.path.join(temp_dir, 'extracted')
-        os.makedirs(extract_folder, exist_ok=True)
-
-        if not extract_zip(zip_path, extract_folder):
-            return {"error": "Failed to extract ZIP file"}
-
-        # Process files and generate documents.json
+        # Read files straight from the archive
         print("\n[STEP 1/4] Processing documents...")
-        documents = process_uploaded_files(extract_folder)
+        ingest_start = time.perf_counter()
+        documents = read_zip_documents(zip_path, progress=progress)
 
         if isinstance(documents, dict) and 'error' in documents:
             return documents
@@ -218,22 +260,39 @@ def process_upload(file_storage):
         if not documents:
             return {"error": "No valid documents found in ZIP"}
 
-        # Save documents.json
-        with open('documents.json', 'w', encoding='utf-8') as f:
-            json.dump(documents, f, indent=2)
+        with _artifact_lock:
+            # Stable ids and what changed since the last upload
+            existing = load_existing_documents()
+            delta = assign_stable_ids(documents, existing)
+            changes = summarize_delta(delta)
+            print(f"[CHANGES] Added: {changes['added']}, changed: {changes['changed']}, "
+                  f"removed: {changes['removed']}, unchanged: {changes['unchanged']}")
+
+            # Chunk into passages and embed them in batches
+            passages, passage_embeddings, document_embeddings = embed_documents(
+                documents, existing, delta if incremental else None, progress=progress
+            )
+            ingest_seconds = round(time.perf_counter() - ingest_start, 3)
+
+            # Save documents.json and embedding stores
+            save_json('documents.json', documents)
+            save_corpus_embeddings(documents, passages, passage_embeddings, document_embeddings)
 
-        print(f"[OK] Saved {len(documents)} documents")
+            print(f"[OK] Saved {len(documents)} documents")
 
-        # Run the pipeline
-        pipeline_result = run_pipeline()
+            # Run the pipeline in-process on the documents already in memory
+            # (incremental uploads patch the existing graph instead of rebuilding it)
+            pipeline_result = run_pipeline(documents, incremental=incremental, progress=progress)
 
         if 'error' in pipeline_result:
-            return pipeline_result
+            return {"error": pipeline_result['error']}
 
         # Return success with stats
         return {
             "success": True,
             "documents_processed": len(documents),
+            "changes": changes,
+            "timings": {"ingest": ingest_seconds, **pipeline_result['timings']},
             "message": f"Successfully processed {len(documents)} documents"
         }
 
@@ -241,9 +300,9 @@ def process_upload(file_storage):
         return {"error": f"Upload processing failed: {str(e)}"}
 
     finally:
-        # Clean up temp directory
-        if temp_dir and os.path.exists(temp_dir):
+        # Clean up the upload's working directory
+        if upload_dir and os.path.exists(upload_dir):
             try:
-                shutil.rmtree(temp_dir)
+                shutil.rmtree(upload_dir)
             except:
                 pass
@@ -0,0 +1,145 @@
+"""
+Transmute - Vector Index
+Inverted-file (IVF) nearest neighbour index over passage embeddings, pure NumPy
+"""
+
+import os
+import numpy as np
+from dotenv import load_dotenv
+from embedding_store import replace_file
+
+load_dotenv()
+
+INDEX_FILE = "vector_index.npz"
+
+# Corpora up to this many vectors are searched exactly (brute force is fast enough)
+EXACT_SEARCH_LIMIT = int(os.getenv("EXACT_SEARCH_LIMIT", "5000"))
+# Number of inverted lists scanned per query in IVF mode
+IVF_PROBES = int(os.getenv("IVF_PROBES", "8"))
+
+def _row_norms(vectors):
+    norms = np.linalg.norm(np.asarray(vectors, dtype='float32'), axis=1)
+    norms[norms == 0] = 1.0
+    return norms
+
+def _spherical_kmeans(vectors, n_lists, iterations=10, seed=0):
+    """Cluster unit vectors by cosine similarity; trains on a sample for speed"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * 64)
+    sample_rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype='float32')
+    sample /= _row_norms(sample)[:, None]
+
+    centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(n_lists):
+            members = sample[assignment == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+    return centroids
+
+class VectorIndex:
+    """
+    Top-k cosine search over an embedding matrix.
+
+    Exact mode scores every row. IVF mode assigns rows to inverted lists
+    around k-means centroids and scores only the rows in the lists closest
+    to the query, so query cost grows with list size instead of corpus size.
+    The index holds row numbers only; vectors stay in the embedding store.
+    """
+
+    def __init__(self, ids, norms, centroids=None, list_offsets=None, list_rows=None):
+        self.ids = list(ids)
+        self.norms = norms
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @property
+    def mode(self):
+        return "exact" if self.centroids is None else "ivf"
+
+    @classmethod
+    def build(cls, ids, vectors, exact_limit=None, n_lists=None):
+        """Build an index; corpora under exact_limit get an exact index"""
+        exact_limit = EXACT_SEARCH_LIMIT if exact_limit is None else exact_limit
+        norms = _row_norms(vectors)
+        if len(vectors) <= exact_limit:
+            return cls(ids, norms)
+
+        n_lists = n_lists or max(int(np.sqrt(len(vectors))), 1)
+        centroids = _spherical_kmeans(vectors, n_lists)
+
+        # Assign every row to its nearest centroid, in blocks to bound memory
+        assignment = np.empty(len(vectors), dtype='int32')
+        for start in range(0, len(vectors), 8192):
+            block = np.asarray(vectors[start:start + 8192], dtype='float32')
+            assignment[start:start + 8192] = np.argmax(block @ centroids.T, axis=1)
+
+        # CSR-style layout: rows of list i are list_rows[list_offsets[i]:list_offsets[i+1]]
+        list_rows = np.argsort(assignment, kind='stable').astype('int64')
+        counts = np.bincount(assignment, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype('int64')
+
+        return cls(ids, norms, centroids, list_offsets, list_rows)
+
+    def search(self, query, vectors, top_k=5, n_probe=None):
+        """
+        Find the top_k most similar rows to query.
+
+        Returns:
+            (rows, similarities) sorted by descending similarity
+        """
+        query = np.asarray(query, dtype='float32')
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.mode == "exact":
+            candidates = None
+            scores = np.asarray(vectors @ query, dtype='float32') / self.norms
+        else:
+            n_probe = min(n_probe or IVF_PROBES, len(self.centroids))
+            centroid_scores = self.centroids @ query
+            probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+            candidates = np.concatenate([
+                self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+                for list_id in probed
+            ])
+            candidates.sort()
+            scores = np.asarray(vectors[candidates] @ query, dtype='float32') / self.norms[candidates]
+
+        top_k = min(top_k, len(scores))
+        if top_k == 0:
+            return np.array([], dtype='int64'), np.array([], dtype='float32')
+
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+        return rows, scores[top]
+
+    def save(self, output_file=INDEX_FILE):
+        """Persist the index (row layout only, not the vectors)"""
+        arrays = {"ids": np.array(self.ids), "norms": self.norms}
+        if self.mode == "ivf":
+            arrays.update(centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+        replace_file(output_file, lambda f: np.savez(f, **arrays))  # chat requests may be reading the old one
+
+def build_vector_index(ids, vectors, output_file=INDEX_FILE):
+    """Build and save the index at ingest time"""
+    index = VectorIndex.build(ids, vectors)
+    index.save(output_file)
+    print(f"  Vector index: {index.mode} over {len(index.ids)} vectors")
+    return index
+
+def load_vector_index(input_file=INDEX_FILE):
+    """Load a saved index"""
+    with np.load(input_file) as data:
+        return VectorIndex(
+            data["ids"].tolist(),
+            data["norms"],
+            data["centroids"] if "centroids" in data else None,
+            data["list_offsets"] if "list_offsets" in data else None,
+            data["list_rows"] if "list_rows" in data else None
+        )
@@ -17,7 +17,7 @@ const Analytics = () => {
         setLoading(true);
         try {
             // Fetch documents
-            const docsResponse = await fetch('http://localhost:5000/api/documents');
+            const docsResponse = await fetch('http://localhost:5000/api/documents?fields=id,title,filename,word_count');
             const docsData = await docsResponse.json();
 
             // Fetch insights
@@ -33,6 +33,36 @@ const Upload = ({ onThemeToggle }) => {
     }
   };
 
+  const stageMessages = {
+    reading: (p) => `Reading documents (${p.files_read || 0}/${p.files_total || '?'})...`,
+    embedding: (p) => `Transmuting documents (${p.files_embedded || 0}/${p.files_total || '?'})...`,
+    building_graph: () => 'Building knowledge graph...',
+    classifying: (p) => `Classifying relationships (${p.edges_classified || 0}/${p.edges_total || '?'})...`,
+    analyzing: () => 'Searching for contradictions...',
+    metrics: () => 'Measuring the transmutation...'
+  };
+
+  const waitForJob = async (jobId) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+
+      const response = await fetch(`http://localhost:5000/api/jobs/${jobId}`);
+      const job = await response.json();
+
+      if (!response.ok || job.status === 'failed') {
+        throw new Error(job.error || 'Upload failed');
+      }
+      if (job.status === 'succeeded') {
+        return job.result;
+      }
+
+      const message = stageMessages[job.stage];
+      if (message) {
+        setUploadStatus(message(job.progress || {}));
+      }
+    }
+  };
+
   const castSpell = async (files) => {
     // Validate file type
     const file = files[0]; // Get first file
@@ -78,12 +108,15 @@ const Upload = ({ onThemeToggle }) => {
         body: formData
       });
 
-      const data = await response.json();
+      const job = await response.json();
 
       if (!response.ok) {
-        throw new Error(data.error || 'Upload failed');
+        throw new Error(job.error || 'Upload failed');
       }
 
+      // Processing runs as a background job: poll until it finishes
+      const data = await waitForJob(job.job_id);
+
       // Success!
       setUploadStatus('Building knowledge graph...');
 
@@ -15,11 +15,11 @@ const Visualize = () => {
     setLoading(true);
     try {
       // Fetch graph data
-      const graphResponse = await fetch('http://localhost:5000/api/graph');
+      const graphResponse = await fetch('http://localhost:5000/api/graph?exclude=content');
       const graphJson = await graphResponse.json();
 
       // Fetch documents for labels
-      const docsResponse = await fetch('http://localhost:5000/api/documents');
+      const docsResponse = await fetch('http://localhost:5000/api/documents?fields=id,title,date,word_count');
       const docsData = await docsResponse.json();
 
       // Process graph data into visualization format